@@ -1,94 +1,257 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
-from datetime import datetime
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, flash, abort, make_response, session, g
+from markupsafe import Markup
+from datetime import date, datetime
+import concurrent.futures
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
 import uuid
-from models import Expense, Participant, SplitType, PaymentType
+from models import DEFAULT_GROUP, Expense, Participant, SplitType, PaymentType
+from groups import GroupLedgers, Partitioned
+from directory import ParticipantDirectory
+from rollups import SpendingRollups
+from settlement import settle_up
+from storage import ConcurrentModificationError, create_repository
+from eventlog import balances_at, latest_snapshot, load_indexes, write_snapshot
+from importer import detect_format, import_expenses, parse_expenses
+from money import adds_up, from_cents, parse_amount, split_evenly, to_cents, total_cents
+from metrics import count_scanned, instrument, render_metrics, timed
+from rendercache import RenderCache
+from writer import BatchWriter
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Needed for flash messages
+# ?profile=1 returns a cProfile summary instead of the page; only enable it where that is safe
+instrument(app, allow_profiling=os.environ.get('SPLITWISE_PROFILING') == '1')
 
-expenses = []
+# SQLite file by default; set SPLITWISE_DATABASE=memory for a throwaway in-process store.
+# The SQLite store can be shared by several worker processes (e.g. gunicorn -w 4)
+repository = create_repository(os.environ.get('SPLITWISE_DATABASE', 'splitwise.db'))
+# Each index is kept per group, so requests in one group never touch another group's data
+group_ledgers = GroupLedgers()
+participant_directory = Partitioned(ParticipantDirectory)
+spending_rollups = Partitioned(SpendingRollups)
+# Everything kept in memory, by snapshot section name; the ledger goes first so point-in-time
+# balance queries only have to read that section
+indexes = {'ledger': group_ledgers, 'directory': participant_directory, 'rollups': spending_rollups}
+# Guards the in-memory indexes against concurrent request threads
+index_lock = threading.RLock()
+# Last change feed entry applied to the indexes; the same number means the same data in every worker
+synced_change = 0
+# Change feed number of the last change that touched each user's balance. Users not listed have
+# not changed since the indexes were loaded, as of loaded_change. Like synced_change, these mean
+# the same thing in every worker, so they can go into ETags
+user_versions = {}
+# The same per group: the change feed number of the last change to any of its expenses
+group_versions = {}
+loaded_change = 0
+# With an event log, a worker snapshots the indexes once this many changes have passed since the last one
+SNAPSHOT_INTERVAL = 50000
+snapshot_sequence = 0
+
+def track_expense(expense):
+    """Bring the in-memory indexes up to date with an added or edited expense"""
+    for index in indexes.values():
+        index.record(expense)
+
+def untrack_expense(expense_id):
+    for index in indexes.values():
+        index.discard(expense_id)
+
+def snapshot_if_due():
+    """Write a snapshot when enough changes have built up since the newest one, by any worker"""
+    global snapshot_sequence
+    if synced_change - snapshot_sequence < SNAPSHOT_INTERVAL:
+        return
+    newest = latest_snapshot(repository.event_log.directory)
+    if newest is not None and newest.sequence > snapshot_sequence:
+        snapshot_sequence = newest.sequence
+        if synced_change - snapshot_sequence < SNAPSHOT_INTERVAL:
+            return
+    # Called with index_lock held, so the states are pickled exactly as of synced_change
+    write_snapshot(repository.event_log, synced_change, {name: index.state() for name, index in indexes.items()})
+    snapshot_sequence = synced_change
+
+@app.before_request
+@timed('sync_indexes')
+def sync_indexes(added=()):
+    """Apply writes made since the last sync, by this or any other worker, to the in-memory indexes.
+
+    added can hold expenses this worker has just added; those are applied as they are rather
+    than reloaded, as long as nothing else has happened to them since.
+    """
+    global synced_change
+    with index_lock:
+        changes = repository.changes_since(synced_change)
+        if not changes:
+            return
+        # Each expense is reloaded once however many times it changed
+        latest = {expense_id: sequence for sequence, expense_id in changes}
+        # An added expense's first change is its add, so if that is its only change and it was
+        # not tracked before, the stored expense is exactly the one in hand
+        fresh = {expense.id: expense for expense in added} if len(latest) == len(changes) else {}
+        for expense_id, sequence in latest.items():
+            touched = group_ledgers.users(expense_id)
+            groups = {group_ledgers.group_of(expense_id)} - {None}
+            expense = fresh.get(expense_id)
+            if expense is None or group_ledgers.group_of(expense_id) is not None:
+                expense = repository.get(expense_id)
+            if expense is None:
+                untrack_expense(expense_id)
+            else:
+                track_expense(expense)
+                touched |= group_ledgers.users(expense_id)
+                groups.add(expense.group_id)
+            for name in touched:
+                user_versions[name] = sequence
+            for group_id in groups:
+                group_versions[group_id] = sequence
+        synced_change = changes[-1][0]
+        if repository.event_log is not None:
+            snapshot_if_due()
+
+# Shared commits for the JSON write API; each batch goes into the indexes straight from the writer
+expense_writer = BatchWriter(repository, on_commit=sync_indexes)
+
+with index_lock:
+    if repository.event_log is not None:
+        # Newest snapshot plus the log after it; the next sync picks up anything committed since
+        synced_change = load_indexes(repository.event_log, indexes)
+        startup_snapshot = latest_snapshot(repository.event_log.directory)
+        snapshot_sequence = startup_snapshot.sequence if startup_snapshot else 0
+    else:
+        # Read the feed position first: anything written during the load is replayed by the next sync
+        synced_change = repository.last_change()
+        for stored_expense in repository.list():
+            track_expense(stored_expense)
+    loaded_change = synced_change
 
 CURRENT_USER = "Veer"
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# Most expenses one POST /api/expenses may add
+MAX_WRITE_BATCH = 1000
 
-def get_user_net_balance(user_name):
-    """Calculate the net balance for a specific user across all expenses"""
-    net_balance = 0.0
-    
-    for expense in expenses:
-        user_participant = None
-        for participant in expense.participants:
-            if participant.name == user_name:
-                user_participant = participant
-                break
-        
-        if user_participant:
-            # User is a participant: Positive = user is owed money, Negative = user owes money
-            expense_balance = user_participant.amount_paid - user_participant.amount_owed
-            net_balance += expense_balance
-        
-        # Check if user made external payments (paid but wasn't a participant)
-        if user_name in expense.external_payments:
-            # User paid for others without being a participant - they are owed this amount
-            net_balance += expense.external_payments[user_name]
-    
-    return net_balance
+def group_route(rule, **options):
+    """Register a view for the default group at rule and for every other group at /g/<group_id>rule.
 
-def get_user_relationships(user_name):
-    """Calculate individual balances between the user and each other user"""
-    relationships = {}
-    
-    # Get all unique users across all expenses
-    all_users = set()
-    for expense in expenses:
-        for participant in expense.participants:
-            all_users.add(participant.name)
-        for payer in expense.external_payments.keys():
-            all_users.add(payer)
-    
-    # Calculate net balance between user and each other user
-    for other_user in all_users:
-        if other_user == user_name:
-            continue
-            
-        net_between_users = 0.0
-        
-        for expense in expenses:
-            balance_summary = expense.get_balance_summary()
-            user_balance = balance_summary.get(user_name, 0.0)
-            other_balance = balance_summary.get(other_user, 0.0)
-            
-            # Simple approach: if both users are in this expense, calculate direct relationship
-            if user_balance != 0 and other_balance != 0:
-                # If user paid more than they owed and other user paid less than they owed
-                # Then other user effectively owes user money from this expense
-                if user_balance > 0 and other_balance < 0:
-                    # User overpaid, other user underpaid
-                    shared_amount = min(abs(user_balance), abs(other_balance))
-                    net_between_users += shared_amount
-                elif user_balance < 0 and other_balance > 0:
-                    # User underpaid, other user overpaid  
-                    shared_amount = min(abs(user_balance), abs(other_balance))
-                    net_between_users -= shared_amount
-        
-        # Only include relationships with non-zero balances
-        if abs(net_between_users) >= 0.01:
-            relationships[other_user] = net_between_users
-    
-    return relationships
+    The group is taken out of the URL values into g.group_id before the view runs, and url_for
+    fills it back in, so views and templates link within the current group without passing it.
+    """
+    def decorator(view):
+        app.add_url_rule(rule, view_func=view, defaults={'group_id': DEFAULT_GROUP}, **options)
+        app.add_url_rule('/g/<group_id>' + rule, view_func=view, **options)
+        return view
+    return decorator
+
+@app.url_value_preprocessor
+def pull_group(endpoint, values):
+    g.group_id = values.pop('group_id', DEFAULT_GROUP) if values else DEFAULT_GROUP
+
+@app.url_defaults
+def add_group(endpoint, values):
+    if 'group_id' not in values and app.url_map.is_endpoint_expecting(endpoint, 'group_id'):
+        values['group_id'] = g.get('group_id', DEFAULT_GROUP)
+
+@app.context_processor
+def group_context():
+    return {'group_id': g.get('group_id', DEFAULT_GROUP), 'default_group': DEFAULT_GROUP}
+
+def find_expense(expense_id):
+    """The expense if it exists in the current group; other groups' expenses are not found"""
+    expense = repository.get(expense_id)
+    count_scanned(1 if expense else 0)
+    return expense if expense is not None and expense.group_id == g.group_id else None
+
+# Rendered fragments and pages, keyed on the versions they were built from
+RENDER_CACHE_BYTES = 32 * 1024 * 1024
+render_cache = RenderCache(RENDER_CACHE_BYTES)
+# Part of every page ETag, so a deploy with changed templates never answers 304 with old markup
+TEMPLATE_DIGEST = hashlib.sha1(b''.join(
+    open(path, 'rb').read() for path in sorted(glob.glob(os.path.join(app.root_path, 'templates', '*.html')))
+)).hexdigest()
+
+def user_version(user_name):
+    with index_lock:
+        return user_versions.get(user_name, loaded_change)
+
+def render_fragment(key, template, context):
+    """A rendered template from the render cache, rendering and storing it on a miss.
+
+    context returns the template variables; it is only called on a miss, so whatever it
+    computes is skipped while the fragment is cached.
+    """
+    return render_cache.get_or_build(key, lambda: Markup(render_template(template, **context())))
+
+def conditional_page(etag_parts, render):
+    """Answer with 304 if the client's copy matches etag_parts, else with render()'s page.
+
+    Pages carrying flash messages are one-offs, so they are rendered without an ETag.
+    """
+    if session.get('_flashes'):
+        return render()
+    etag = hashlib.sha1(repr((TEMPLATE_DIGEST,) + tuple(etag_parts)).encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    # Browsers may keep the page but must revalidate it with the ETag on every visit
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
+@timed('get_user_net_balance')
+def get_user_net_balance(user_name, group_id=DEFAULT_GROUP):
+    """Net balance for a specific user across the group's expenses, read from its running ledger"""
+    with index_lock:
+        return group_ledgers.get(group_id).balance(user_name)
 
-@app.route('/')
+@timed('get_user_relationships')
+def get_user_relationships(user_name, group_id=DEFAULT_GROUP):
+    """Individual balances between the user and each other user in the group, read from its ledger's debt matrix"""
+    with index_lock:
+        return group_ledgers.get(group_id).relationships(user_name)
+
+@timed('get_user_total_balance')
+def get_user_total_balance(user_name):
+    """Net balance for a user summed over every group, from the ledgers of the groups they have a balance in"""
+    with index_lock:
+        return group_ledgers.total(user_name)
+
+@group_route('/')
 def index():
-    user_balance = get_user_net_balance(CURRENT_USER)
-    user_relationships = get_user_relationships(CURRENT_USER)
-    return render_template('index.html', expenses=expenses, user_balance=user_balance, 
-                         user_relationships=user_relationships, current_user=CURRENT_USER)
+    cursor = request.args.get('cursor') or None
+    try:
+        page, next_cursor = repository.page(cursor, PAGE_SIZE, g.group_id)
+    except ValueError:
+        abort(400)
+    count_scanned(len(page))
+    balance_version = user_version(CURRENT_USER)
+
+    def render():
+        sidebar = render_fragment(('sidebar', g.group_id, CURRENT_USER, balance_version), 'balance_sidebar.html', lambda: {
+            'user_balance': get_user_net_balance(CURRENT_USER, g.group_id),
+            'user_relationships': get_user_relationships(CURRENT_USER, g.group_id),
+            'total_balance': get_user_total_balance(CURRENT_USER),
+            'current_user': CURRENT_USER,
+        })
+        expense_cards = [render_fragment(('card', e.id, e.version), 'expense_card.html', lambda: {'expense': e}) for e in page]
+        return render_template('index.html', expense_cards=expense_cards, sidebar=sidebar,
+                               next_cursor=next_cursor, is_first_page=cursor is None)
 
-@app.route('/add_expense', methods=['GET', 'POST'])
+    return conditional_page(('index', g.group_id, CURRENT_USER, balance_version, cursor, next_cursor,
+                             tuple((e.id, e.version) for e in page)), render)
+
+@group_route('/add_expense', methods=['GET', 'POST'])
 def add_expense():
     if request.method == 'POST':
         try:
             title = request.form['title']
-            amount = float(request.form['amount'])
+            amount = parse_amount(request.form['amount'])
             paid_by = request.form['paid_by']
             # Parse multiple payers from the tag system
             payer_names = [name.strip() for name in paid_by.split(',') if name.strip()]
@@ -121,7 +284,8 @@ def add_expense():
                 split_type=split_type,
                 payment_type=payment_type,
                 date=datetime.now(),
-                category=category if category else None
+                category=category if category else None,
+                group_id=g.group_id
             )
             
             # Handle payments based on payment type
@@ -131,17 +295,17 @@ def add_expense():
                 payments[participant.name] = 0.0
             
             if payment_type == PaymentType.EQUAL:
-                # Distribute payment equally among payers
-                per_payer_amount = amount / len(payer_names) if payer_names else amount
-                for payer_name in payer_names:
-                    payments[payer_name] = per_payer_amount
+                # Distribute payment equally among payers, in whole cents
+                shares = split_evenly(to_cents(amount), len(payer_names)) if payer_names else []
+                for payer_name, share in zip(payer_names, shares):
+                    payments[payer_name] = from_cents(share)
             else:  # PaymentType.UNEQUAL
                 # Get unequal payment amounts from form
                 unequal_payments = {}
                 for payer_name in payer_names:
                     payment_field = f'payment_amount_{payer_name}'
                     if payment_field in request.form:
-                        unequal_payments[payer_name] = float(request.form[payment_field])
+                        unequal_payments[payer_name] = parse_amount(request.form[payment_field])
                     else:
                         unequal_payments[payer_name] = 0.0
                 
@@ -164,7 +328,7 @@ def add_expense():
                 for participant in participants:
                     split_field = f'split_amount_{participant.name}'
                     if split_field in request.form:
-                        unequal_splits[participant.name] = float(request.form[split_field])
+                        unequal_splits[participant.name] = parse_amount(request.form[split_field])
                     else:
                         unequal_splits[participant.name] = 0.0
                 
@@ -182,8 +346,9 @@ def add_expense():
             
             # Validate that amounts balance correctly
             if expense.split_type == SplitType.UNEQUAL:
-                total_owed = sum(p.amount_owed for p in expense.participants)
-                if abs(total_owed - expense.amount) > 0.01:
+                owed = [p.amount_owed for p in expense.participants]
+                if not adds_up(owed, expense.amount):
+                    total_owed = from_cents(total_cents(owed))
                     flash(f"Error: Split amounts (${total_owed:.2f}) don't match expense total (${expense.amount:.2f})", 'error')
                     return render_template('add_expense.html')
             
@@ -192,7 +357,8 @@ def add_expense():
                 flash(f"Error: Total payments (${total_paid:.2f}) don't match expense amount (${expense.amount:.2f})", 'error')
                 return render_template('add_expense.html')
             
-            expenses.append(expense)
+            repository.add(expense)
+            sync_indexes()
             flash('Expense added successfully!', 'success')
             return redirect(url_for('index'))
             
@@ -205,29 +371,35 @@ def add_expense():
     
     return render_template('add_expense.html')
 
-@app.route('/expense/<expense_id>')
+@group_route('/expense/<expense_id>')
 def view_expense(expense_id):
-    expense = next((e for e in expenses if e.id == expense_id), None)
+    expense = find_expense(expense_id)
     if not expense:
         return "Expense not found", 404
-    
-    balance_summary = expense.get_balance_summary()
-    return render_template('expense_detail.html', expense=expense, balances=balance_summary)
 
-@app.route('/edit_expense/<expense_id>', methods=['GET', 'POST'])
+    def render():
+        # The page only depends on the expense, so it is cached whole, summary included
+        return render_cache.get_or_build(('detail', expense.id, expense.version), lambda: render_template(
+            'expense_detail.html', expense=expense, balances=expense.get_balance_summary()))
+
+    return conditional_page(('detail', expense.id, expense.version), render)
+
+@group_route('/edit_expense/<expense_id>', methods=['GET', 'POST'])
 def edit_expense(expense_id):
-    expense = next((e for e in expenses if e.id == expense_id), None)
+    expense = find_expense(expense_id)
     if not expense:
         flash('Expense not found', 'error')
         return redirect(url_for('index'))
     
     if request.method == 'POST':
         try:
+            # Save against the version the form was rendered from, so a concurrent edit is not overwritten
+            expense.version = int(request.form.get('version', expense.version))
             # Store previous payers before updating
             previous_payer_names = [name.strip() for name in expense.paid_by.split(',') if name.strip()]
             
             expense.title = request.form['title']
-            expense.amount = float(request.form['amount'])
+            expense.amount = parse_amount(request.form['amount'])
             expense.paid_by = request.form['paid_by']
             # Parse multiple payers from the tag system  
             payer_names = [name.strip() for name in expense.paid_by.split(',') if name.strip()]
@@ -266,17 +438,17 @@ def edit_expense(expense_id):
                 payments[previous_payer] = 0.0
             
             if expense.payment_type == PaymentType.EQUAL:
-                # Distribute payment equally among current payers
-                per_payer_amount = expense.amount / len(payer_names) if payer_names else expense.amount
-                for payer_name in payer_names:
-                    payments[payer_name] = per_payer_amount
+                # Distribute payment equally among current payers, in whole cents
+                shares = split_evenly(to_cents(expense.amount), len(payer_names)) if payer_names else []
+                for payer_name, share in zip(payer_names, shares):
+                    payments[payer_name] = from_cents(share)
             else:  # PaymentType.UNEQUAL
                 # Get unequal payment amounts from form
                 unequal_payments = {}
                 for payer_name in payer_names:
                     payment_field = f'payment_amount_{payer_name}'
                     if payment_field in request.form:
-                        unequal_payments[payer_name] = float(request.form[payment_field])
+                        unequal_payments[payer_name] = parse_amount(request.form[payment_field])
                     else:
                         unequal_payments[payer_name] = 0.0
                 
@@ -300,7 +472,7 @@ def edit_expense(expense_id):
                 for participant in expense.participants:
                     split_field = f'split_amount_{participant.name}'
                     if split_field in request.form:
-                        unequal_splits[participant.name] = float(request.form[split_field])
+                        unequal_splits[participant.name] = parse_amount(request.form[split_field])
                     else:
                         unequal_splits[participant.name] = 0.0
                 
@@ -318,8 +490,9 @@ def edit_expense(expense_id):
             
             # Validate that amounts balance correctly
             if expense.split_type == SplitType.UNEQUAL:
-                total_owed = sum(p.amount_owed for p in expense.participants)
-                if abs(total_owed - expense.amount) > 0.01:
+                owed = [p.amount_owed for p in expense.participants]
+                if not adds_up(owed, expense.amount):
+                    total_owed = from_cents(total_cents(owed))
                     flash(f"Error: Split amounts (${total_owed:.2f}) don't match expense total (${expense.amount:.2f})", 'error')
                     return render_template('edit_expense.html', expense=expense)
             
@@ -328,9 +501,19 @@ def edit_expense(expense_id):
                 flash(f"Error: Total payments (${total_paid:.2f}) don't match expense amount (${expense.amount:.2f})", 'error')
                 return render_template('edit_expense.html', expense=expense)
             
+            try:
+                repository.update(expense)
+            except KeyError:
+                # Deleted by someone else while this form was open
+                flash('Expense not found', 'error')
+                return redirect(url_for('index'))
+            sync_indexes()
             flash('Expense updated successfully!', 'success')
             return redirect(url_for('view_expense', expense_id=expense_id))
             
+        except ConcurrentModificationError:
+            flash('Error: This expense was changed by someone else while you were editing it. Please review the latest version and try again.', 'error')
+            return redirect(url_for('edit_expense', expense_id=expense_id))
         except ValueError as e:
             flash(f"Error: Invalid input - {str(e)}", 'error')
             return render_template('edit_expense.html', expense=expense)
@@ -340,20 +523,178 @@ def edit_expense(expense_id):
     
     return render_template('edit_expense.html', expense=expense)
 
-@app.route('/delete_expense/<expense_id>', methods=['POST'])
+@group_route('/delete_expense/<expense_id>', methods=['POST'])
 def delete_expense(expense_id):
-    global expenses
-    expenses = [e for e in expenses if e.id != expense_id]
+    if find_expense(expense_id):
+        repository.delete(expense_id)
+        sync_indexes()
     return redirect(url_for('index'))
 
-@app.route('/api/participants')
+@group_route('/api/expenses')
+def list_expenses():
+    try:
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        page, next_cursor = repository.page(request.args.get('cursor') or None, limit, g.group_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    count_scanned(len(page))
+
+    def generate():
+        # Stream one expense at a time instead of building the whole document in memory
+        yield '{"expenses": ['
+        for position, expense in enumerate(page):
+            yield (',' if position else '') + json.dumps(expense.to_dict())
+        yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
+    return Response(generate(), mimetype='application/json')
+
+@group_route('/api/expenses', methods=['POST'])
+def create_expenses():
+    """Add one expense (a JSON object) or several (a JSON array of them), laid out like JSONL
+    import rows; answers once they are committed to disk. A batch with any invalid item adds nothing.
+
+    A 503 means the commit did not finish in time, not that it failed: the expenses may still
+    be added, so check before sending them again."""
+    payload = request.get_json(silent=True)
+    single = isinstance(payload, dict)
+    items = [payload] if single else payload
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Expected a JSON object or a non-empty array of them'}), 400
+    if len(items) > MAX_WRITE_BATCH:
+        return jsonify({'error': f'At most {MAX_WRITE_BATCH} expenses per request'}), 413
+    expenses, errors = parse_expenses(items, g.group_id)
+    count_scanned(len(items))
+    if errors:
+        return jsonify({'errors': [{'index': error.line, 'message': error.message} for error in errors]}), 400
+    try:
+        expense_writer.write(expenses)
+    except concurrent.futures.TimeoutError:
+        return jsonify({'error': 'Timed out waiting for the write to commit; it may still be added, '
+                                 'so check before retrying'}), 503
+    sync_indexes()
+    if single:
+        return jsonify(expenses[0].to_dict()), 201
+    return jsonify({'ids': [expense.id for expense in expenses]}), 201
+
+@group_route('/api/import', methods=['POST'])
+def bulk_import():
+    """Import a CSV/JSONL file uploaded as 'file' (or sent as the raw request body)"""
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, filename = upload.stream, upload.filename or ''
+    else:
+        stream, filename = request.stream, ''
+    file_format = request.args.get('format') or detect_format(filename)
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+    def record_batch(batch):
+        sync_indexes()
+
+    try:
+        report = import_expenses(text, file_format, repository, on_commit=record_batch, group_id=g.group_id)
+        count_scanned(report.imported + report.failed)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report.to_dict()), 200 if not report.failed else 207
+
+@group_route('/api/participants')
 def get_participants():
-    all_participants = set()
-    for expense in expenses:
-        all_participants.add(expense.paid_by)
-        for participant in expense.participants:
-            all_participants.add(participant.name)
-    return jsonify(list(all_participants))
+    """Autocomplete: names starting with ?q=, most used first"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    with index_lock:
+        # Only writes to this group change its names
+        group_version = group_versions.get(g.group_id, loaded_change)
+        etag = hashlib.sha1(f'{group_version}:{g.group_id}:{limit}:{query}'.encode()).hexdigest()
+        names = None if request.if_none_match.contains(etag) else participant_directory.get(g.group_id).search(query, limit)
+    if names is None:
+        response = Response(status=304)
+    else:
+        response = jsonify(names)
+    response.set_etag(etag)
+    # Let browsers keep the list but revalidate it with the ETag on every use
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
+
+@group_route('/api/reports')
+@timed('reports')
+def spending_report():
+    """Spending between ?start= and ?end= (YYYY-MM-DD, inclusive), optionally for one ?user= and
+    ?category=, broken down by ?period=day or month"""
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else date.min
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else date.max
+        period = request.args.get('period', 'month')
+        user = request.args.get('user') or None
+        category = request.args.get('category') or None
+        with index_lock:
+            rollups = spending_rollups.get(g.group_id)
+            total = rollups.total(start, end, user, category)
+            periods = rollups.breakdown(start, end, period, user, category)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'user': user,
+        'category': category,
+        'start': request.args.get('start'),
+        'end': request.args.get('end'),
+        'period': period,
+        'total': total,
+        'periods': [{'period': label, 'amount': amount} for label, amount in periods],
+    })
+
+@group_route('/api/balances')
+def get_balances():
+    """Everyone's net balance in the group, now or as it stood at ?at= (ISO date/time) when history is kept"""
+    at = request.args.get('at')
+    if not at:
+        with index_lock:
+            return jsonify(group_ledgers.get(g.group_id).balances())
+    if repository.event_log is None:
+        return jsonify({'error': 'History is not kept for in-memory storage or on this platform'}), 400
+    try:
+        when = datetime.fromisoformat(at).timestamp()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(balances_at(repository.event_log, when, g.group_id))
+
+@group_route('/api/settle')
+def settle():
+    strategy = request.args.get('strategy', 'auto')
+    try:
+        with index_lock:
+            balances = group_ledgers.get(g.group_id).balances()
+        transfers = settle_up(balances, strategy=strategy)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify([
+        {'from': debtor, 'to': creditor, 'amount': amount}
+        for debtor, creditor, amount in transfers
+    ])
+
+@app.route('/api/groups')
+def list_groups():
+    """Every group with any expenses, and how many each has"""
+    with index_lock:
+        groups = group_ledgers.groups()
+    return jsonify([{'id': group_id, 'expenses': count} for group_id, count in sorted(groups.items())])
+
+@app.route('/api/users/<user_name>/balance')
+def get_user_balance(user_name):
+    """A user's net balance in each group they have one in, and the total over all of them"""
+    with index_lock:
+        groups = group_ledgers.group_balances(user_name)
+        total = group_ledgers.total(user_name)
+    return jsonify({'user': user_name, 'total': total, 'groups': groups})
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     app.run(debug=True, host='127.0.0.1', port=5001)
\ No newline at end of file
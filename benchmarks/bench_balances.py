@@ -0,0 +1,30 @@
+"""Compare the running balance ledger against a full rescan of every expense.
+
+Usage: python benchmarks/bench_balances.py [sizes...]   (default: 100 10000 100000)
+Pass 1000000 to check the 1M-expense case; it needs a couple of GB of memory.
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import BalanceLedger, compute_net_balances_cents
+from synthetic import LedgerSpec, generate
+
+
+def main(sizes):
+    print(f"{'expenses':>10} {'rescan (ms)':>12} {'ledger (us)':>12}")
+    for size in sizes:
+        expenses = list(generate(LedgerSpec(expenses=size)))
+        ledger = BalanceLedger()
+        ledger.rebuild(expenses)
+        assert not ledger.verify(expenses), "ledger drifted from full recompute"
+
+        rescan = min(timeit.repeat(lambda: compute_net_balances_cents(expenses).get("Veer", 0), number=1, repeat=3))
+        lookup = min(timeit.repeat(lambda: ledger.balance("Veer"), number=10000, repeat=3)) / 10000
+        print(f"{size:>10} {rescan * 1e3:>12.2f} {lookup * 1e6:>12.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100, 10000, 100000])
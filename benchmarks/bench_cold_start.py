@@ -0,0 +1,118 @@
+"""Cold start from the event log: full replay vs newest snapshot plus the log tail.
+
+Usage: python benchmarks/bench_cold_start.py [events] [live expenses] [tail events]
+       (defaults: 1000000 100000 10000; pass 10000000 for the 10M-event case, which
+       needs a few GB of disk in the temp directory and the better part of an hour)
+
+Builds a log where a fixed set of live expenses is edited over and over (with some deletes
+and re-adds), so history grows while the live data stays the same size, then times restoring
+the ledger, participant directory and spending rollups both ways.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from directory import ParticipantDirectory
+from eventlog import ADD, EDIT, Event, EventLog, load_indexes, write_snapshot
+from groups import GroupLedgers, Partitioned
+from rollups import SpendingRollups
+from synthetic import LedgerSpec, generate as generate_expenses
+
+CHUNK = 10000
+
+
+def new_indexes():
+    # Partitioned by group, as the app keeps them
+    return {"ledger": GroupLedgers(), "directory": Partitioned(ParticipantDirectory), "rollups": Partitioned(SpendingRollups)}
+
+
+def generate(log, count, live, rng, state):
+    """Append count events: edits of random live expenses, with 5% deletes each followed by an add"""
+    expenses = state.setdefault("expenses", generate_expenses(LedgerSpec(expenses=10 ** 9, seed=1)))
+    live_ids = state.setdefault("live", [])
+    sequence = state.get("sequence", 0)
+    written = 0
+    while written < count:
+        events = []
+        for _ in range(min(CHUNK, count - written)):
+            sequence += 1
+            if len(live_ids) < live:
+                expense = next(expenses)
+                live_ids.append(expense.id)
+                events.append(Event.for_expense(sequence, ADD, expense))
+            elif rng.random() < 0.05:
+                position = rng.randrange(len(live_ids))
+                events.append(Event.for_delete(sequence, live_ids[position]))
+                live_ids[position] = live_ids[-1]
+                live_ids.pop()
+            else:
+                expense = next(expenses)
+                expense.id = rng.choice(live_ids)
+                events.append(Event.for_expense(sequence, EDIT, expense))
+        with log.locked():
+            log.append(events)
+        written += len(events)
+    state["sequence"] = sequence
+
+
+def timed_load(directory):
+    start = time.perf_counter()
+    indexes = new_indexes()
+    log = EventLog(directory)
+    sequence = load_indexes(log, indexes)
+    elapsed = time.perf_counter() - start
+    log.close()
+    return elapsed, sequence, indexes
+
+
+def timed_load_without_snapshot(directory, snapshot):
+    """Time a start with the snapshot moved out of the way, as if it had never been taken"""
+    hidden = snapshot.path + ".hidden"
+    os.rename(snapshot.path, hidden)
+    try:
+        return timed_load(directory)
+    finally:
+        os.rename(hidden, snapshot.path)
+
+
+def main(argv):
+    events = int(argv[1]) if len(argv) > 1 else 1000000
+    live = int(argv[2]) if len(argv) > 2 else 100000
+    tail = int(argv[3]) if len(argv) > 3 else 10000
+    directory = tempfile.mkdtemp()
+    log = EventLog(directory)
+    rng = random.Random(0)
+    state = {}
+
+    start = time.perf_counter()
+    generate(log, events - tail, live, rng, state)
+    print(f"wrote {events - tail} events in {time.perf_counter() - start:.1f}s")
+
+    _, sequence, indexes = timed_load(directory)
+    start = time.perf_counter()
+    snapshot = write_snapshot(log, sequence, {name: index.state() for name, index in indexes.items()})
+    snapshot_time = time.perf_counter() - start
+    del indexes
+    generate(log, tail, live, rng, state)
+
+    full_replay, _, _ = timed_load_without_snapshot(directory, snapshot)
+    cold, sequence, indexes = timed_load(directory)
+    assert sequence == state["sequence"]
+
+    log_size = os.path.getsize(log.path) / 2 ** 20
+    snapshot_size = os.path.getsize(snapshot.path) / 2 ** 20
+    print(f"events={events} live={len(state['live'])} log={log_size:.0f} MiB snapshot={snapshot_size:.0f} MiB "
+          f"(written in {snapshot_time:.1f}s)")
+    print(f"{'full replay':>28}: {full_replay:8.2f}s")
+    print(f"{'snapshot + ' + str(tail) + ' tail events':>28}: {cold:8.2f}s")
+    log.close()
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
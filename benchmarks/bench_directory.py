@@ -0,0 +1,55 @@
+"""Latency of participant autocomplete lookups against a directory of many distinct names.
+
+Usage: python benchmarks/bench_directory.py [names]   (default: 100000)
+Reports cold (first lookup after a write) and cached lookups for short and long prefixes.
+"""
+import os
+import random
+import string
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from directory import ParticipantDirectory
+from models import Expense, Participant, SplitType
+
+
+def random_name(rng):
+    return rng.choice(string.ascii_uppercase) + "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+
+
+def main(count, seed=0):
+    rng = random.Random(seed)
+    names = list({random_name(rng) for _ in range(count * 2)})[:count]
+    directory = ParticipantDirectory()
+    start = time.perf_counter()
+    for index in range(0, len(names), 4):
+        group = names[index:index + 4] + rng.sample(names, 2)
+        directory.record(Expense(
+            id=str(uuid.UUID(int=rng.getrandbits(128), version=4)), title="bench", amount=10.0, paid_by=group[0],
+            participants=[Participant(name=name) for name in group], split_type=SplitType.EQUAL, date=datetime(2024, 1, 1),
+        ))
+    print(f"names={len(directory)} build={time.perf_counter() - start:.2f}s")
+
+    print(f"{'prefix':>8} {'cold (us)':>10} {'cached (us)':>12}")
+    for prefix in ("", "v", "ve", "ver", "verb"):
+        # Another write invalidates the cache, so the first lookup does the real work
+        directory.record(Expense(
+            id=str(uuid.uuid4()), title="bench", amount=1.0, paid_by="Veer",
+            participants=[Participant(name="Veer")], split_type=SplitType.EQUAL, date=datetime(2024, 1, 1),
+        ))
+        start = time.perf_counter()
+        directory.search(prefix, 10)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(1000):
+            directory.search(prefix, 10)
+        cached = (time.perf_counter() - start) / 1000
+        print(f"{prefix!r:>8} {cold * 1e6:>10.1f} {cached * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
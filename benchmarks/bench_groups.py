@@ -0,0 +1,60 @@
+"""Per-request latency in one small group as the number of groups in the process grows.
+
+Usage: python benchmarks/bench_groups.py [group counts...]   (default: 10 1000 5000)
+Every group gets 20 expenses among its own 6 members plus Veer, who is in every group.
+The group pages should cost the same however many groups there are; the cross-group
+total grows with the number of groups Veer has a balance in, not with the number of expenses.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["SPLITWISE_DATABASE"] = os.path.join(tempfile.mkdtemp(), "groups.db")
+
+import app as splitwise
+from synthetic import LedgerSpec, generate
+
+EXPENSES_PER_GROUP = 20
+URLS = ["/g/group0/", "/g/group0/api/balances", "/g/group0/api/settle", "/api/users/Veer/balance"]
+
+
+def add_groups(start, end):
+    batch = []
+    for number in range(start, end):
+        members = ["Veer"] + [f"g{number}-user{i}" for i in range(6)]
+        for expense in generate(LedgerSpec(expenses=EXPENSES_PER_GROUP, seed=number), users=members):
+            expense.group_id = f"group{number}"
+            batch.append(expense)
+    splitwise.repository.add_many(batch)
+
+
+def median_ms(client, url, requests=200):
+    client.get(url)
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return statistics.median(samples) * 1e3
+
+
+def main(counts):
+    client = splitwise.app.test_client()
+    print(f"{'groups':>8} {'expenses':>9} " + " ".join(f"{url:>26}" for url in URLS) + "   (median ms)")
+    groups = 0
+    for count in counts:
+        add_groups(groups, count)
+        groups = count
+        client.get("/api/groups")  # let the indexes catch up before timing
+        print(f"{groups:>8} {groups * EXPENSES_PER_GROUP:>9} " + " ".join(f"{median_ms(client, url):>26.3f}" for url in URLS))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10, 1000, 5000])
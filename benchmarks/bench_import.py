@@ -0,0 +1,68 @@
+"""Rows per second and peak memory of the bulk importer.
+
+Usage: python benchmarks/bench_import.py [rows...]   (default: 10000 100000)
+Rows are streamed from a generated CSV into a throwaway SQLite database; peak
+traced memory should stay roughly the same whatever the row count.
+"""
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from importer import import_expenses
+from storage import SQLiteExpenseRepository
+from synthetic import make_users
+
+COLUMNS = ['title', 'amount', 'paid_by', 'participants', 'split_type', 'payment_type', 'date', 'category', 'payments', 'splits']
+
+
+def write_csv(path, rows, seed=0):
+    rng = random.Random(seed)
+    users = make_users(200)
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(COLUMNS)
+        for index in range(rows):
+            names = rng.sample(users, rng.randint(2, 5))
+            amount = rng.randint(100, 50000) / 100
+            if rng.random() < 0.3:
+                first = round(amount / 3, 2)
+                splits = f"{names[0]}:{first}," + ",".join(f"{name}:0" for name in names[1:-1]) + f",{names[-1]}:{round(amount - first, 2)}"
+                split_type = 'unequal'
+            else:
+                splits, split_type = '', 'equal'
+            writer.writerow([
+                f"Expense {index}", amount, names[0], ",".join(names), split_type, 'equal',
+                f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", rng.choice(['Food', 'Travel', '']), '', splits,
+            ])
+
+
+def main(sizes):
+    directory = tempfile.mkdtemp()
+    print(f"{'rows':>8} {'rows/s':>10} {'peak MiB':>9} {'failed':>7}")
+    for rows in sizes:
+        path = os.path.join(directory, f"import-{rows}.csv")
+        write_csv(path, rows)
+
+        start = time.perf_counter()
+        with open(path, newline='') as stream:
+            report = import_expenses(stream, 'csv', SQLiteExpenseRepository(os.path.join(directory, f"timed-{rows}.db")))
+        elapsed = time.perf_counter() - start
+
+        # tracemalloc slows everything down, so memory is measured on a separate run
+        tracemalloc.start()
+        with open(path, newline='') as stream:
+            import_expenses(stream, 'csv', SQLiteExpenseRepository(os.path.join(directory, f"traced-{rows}.db")))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"{rows:>8} {rows / elapsed:>10.0f} {peak / 2 ** 20:>9.1f} {report.failed:>7}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
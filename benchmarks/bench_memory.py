@@ -0,0 +1,48 @@
+"""Memory held by N expenses as Expense dataclasses vs CompactExpense, measured with tracemalloc.
+
+Usage: python benchmarks/bench_memory.py [count]   (default: 100000)
+Pass 1000000 for the 1M-expense comparison; the dataclass side needs a few GB.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact import CompactExpense, NameTable
+from synthetic import LedgerSpec, generate
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, current
+
+
+def main(count):
+    expenses, plain = measure(lambda: list(generate(LedgerSpec(expenses=count))))
+    del expenses
+
+    def build_compact():
+        # Convert from a fresh stream so ids, titles and dates are counted on this side too
+        names = NameTable()
+        return [CompactExpense.from_expense(expense, names) for expense in generate(LedgerSpec(expenses=count))]
+
+    compact, packed = measure(build_compact)
+
+    for expense, packed_expense in zip(generate(LedgerSpec(expenses=1000)), compact):
+        assert packed_expense.get_balance_summary() == expense.get_balance_summary()
+        assert packed_expense.to_dict() == expense.to_dict()
+
+    print(f"expenses={count}")
+    print(f"  dataclass: {plain / 2 ** 20:8.1f} MiB  ({plain / count:6.0f} B/expense)")
+    print(f"  compact:   {packed / 2 ** 20:8.1f} MiB  ({packed / count:6.0f} B/expense)")
+    print(f"  reduction: {1 - packed / plain:8.1%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,185 @@
+"""Randomised zero-drift check and float vs integer-cents throughput for expense splitting.
+
+Usage: python benchmarks/bench_money.py [expenses]   (default: 1000000)
+
+The check runs the app's own code path on a synthetic ledger (synthetic.py) with equal and
+unequal splits and payments and external payers: Expense.calculate_splits and set_payments
+through to_cents/from_cents into a BalanceLedger, followed by a round of edits and deletes.
+Every expense must balance to the cent, and the ledger must sum to exactly zero and agree
+with a full recompute.
+
+The timings compare the same equal-split workload in integer cents, floats and Decimal.
+The Decimal version gives leftover cents out the same way split_evenly does, so it is exact
+too and only its speed differs; floats show the drift integer cents replace.
+"""
+import os
+import random
+import sys
+import time
+from decimal import ROUND_DOWN, Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ledger import BalanceLedger
+from models import PaymentType, SplitType
+from money import from_cents, split_evenly, to_cents
+from synthetic import LedgerSpec, generate
+
+USERS = [f"user{i}" for i in range(100)]
+# Of the expenses seen so far, how many stay candidates for a later edit or delete
+EDIT_POOL = 1000
+
+
+def check_expense(expense):
+    """The properties every stored expense must have, checked in integer cents"""
+    amount = to_cents(expense.amount)
+    assert from_cents(amount) == expense.amount, expense
+    assert sum(to_cents(p.amount_owed) for p in expense.participants) == amount, expense
+    assert expense.validate_payments(), expense
+    assert sum(expense.get_balance_summary_cents().values()) == 0, expense
+
+
+def random_parts(rng, total, count):
+    cuts = sorted(rng.randint(0, total) for _ in range(count - 1))
+    return [end - start for start, end in zip([0] + cuts, cuts + [total])]
+
+
+def randomise(expense, rng):
+    """Edit an expense the way the edit form can: new amount, split, payers and payment type"""
+    cents = rng.randint(1, 10 ** 7)
+    expense.amount = from_cents(cents)
+    names = [p.name for p in expense.participants]
+    payers = rng.sample(names, rng.randint(1, len(names)))
+    if rng.random() < 0.1:
+        payers.append(rng.choice([user for user in USERS if user not in names]))
+    expense.paid_by = ", ".join(payers)
+    expense.split_type = rng.choice([SplitType.EQUAL, SplitType.UNEQUAL])
+    expense.payment_type = rng.choice([PaymentType.EQUAL, PaymentType.UNEQUAL])
+    if expense.split_type == SplitType.UNEQUAL:
+        for participant, share in zip(expense.participants, random_parts(rng, cents, len(names))):
+            participant.amount_owed = from_cents(share)
+    expense.calculate_splits()
+    paid = split_evenly(cents, len(payers)) if expense.payment_type == PaymentType.EQUAL else random_parts(rng, cents, len(payers))
+    expense.set_payments({payer: from_cents(share) for payer, share in zip(payers, paid)})
+
+
+def check_app_path(count, seed):
+    """Property: no cent is created or lost between the models and the ledger.
+
+    Runs on a synthetic ledger whose mix of split and payment types, group sizes and external
+    payers is itself drawn from the seed. About a tenth of the expenses are edited or deleted
+    later on, as the edit form and delete button would. Expenses are streamed, so only the
+    edited ones are held in memory; the recompute regenerates the rest.
+    """
+    rng = random.Random(seed)
+    spec = LedgerSpec(users=len(USERS), expenses=count, max_participants=rng.randint(2, 8),
+                      max_payers=rng.randint(1, 3), unequal_split_share=rng.random(),
+                      unequal_payment_share=rng.random(), external_payer_share=rng.random() / 5, seed=seed)
+    ledger = BalanceLedger()
+    pool = []
+    changed = {}  # expense id -> the edited expense, or None once deleted
+    for expense in generate(spec, USERS):
+        check_expense(expense)
+        ledger.record(expense)
+        if len(pool) < EDIT_POOL:
+            pool.append(expense)
+        else:
+            pool[rng.randrange(EDIT_POOL)] = expense
+        if rng.random() < 0.1:
+            target = rng.choice(pool)
+            if changed.get(target.id, target) is None:
+                continue
+            if rng.random() < 0.3:
+                ledger.discard(target.id)
+                changed[target.id] = None
+            else:
+                randomise(target, rng)
+                check_expense(target)
+                ledger.record(target)
+                changed[target.id] = target
+
+    def final_expenses():
+        for expense in generate(spec, USERS):
+            expense = changed.get(expense.id, expense)
+            if expense is not None:
+                yield expense
+
+    assert sum(ledger.balances_cents().values()) == 0, "ledger balances drifted"
+    assert not ledger.verify(final_expenses()), "ledger disagrees with a full recompute"
+    return sum(1 for expense in changed.values() if expense is not None), sum(1 for expense in changed.values() if expense is None)
+
+
+def generate_workload(count, seed):
+    rng = random.Random(seed)
+    for _ in range(count):
+        names = rng.sample(USERS, rng.randint(1, 8))
+        payers = names[:rng.randint(1, len(names))]
+        yield rng.randint(1, 10 ** 7), names, payers
+
+
+def cents_path(workload):
+    balances = dict.fromkeys(USERS, 0)
+    for total, names, payers in workload:
+        for name, share in zip(names, split_evenly(total, len(names))):
+            balances[name] -= share
+        for payer, share in zip(payers, split_evenly(total, len(payers))):
+            balances[payer] += share
+    return balances
+
+
+def float_path(workload):
+    balances = dict.fromkeys(USERS, 0.0)
+    for total, names, payers in workload:
+        amount = total / 100
+        per_person = amount / len(names)
+        per_payer = amount / len(payers)
+        for name in names:
+            balances[name] -= per_person
+        for payer in payers:
+            balances[payer] += per_payer
+    return balances
+
+
+def decimal_shares(amount, count):
+    """Equal shares of a Decimal amount in whole cents, leftover cents to the first shares"""
+    cent = Decimal("0.01")
+    share = (amount / count).quantize(cent, rounding=ROUND_DOWN)
+    extra = int((amount - share * count) / cent)
+    return [share + cent] * extra + [share] * (count - extra)
+
+
+def decimal_path(workload):
+    balances = dict.fromkeys(USERS, Decimal(0))
+    for total, names, payers in workload:
+        amount = Decimal(total) / 100
+        for name, share in zip(names, decimal_shares(amount, len(names))):
+            balances[name] -= share
+        for payer, share in zip(payers, decimal_shares(amount, len(payers))):
+            balances[payer] += share
+    return balances
+
+
+def timed(path, workload):
+    start = time.perf_counter()
+    balances = path(workload)
+    return balances, len(workload) / (time.perf_counter() - start)
+
+
+def main(count, seed=0):
+    start = time.perf_counter()
+    edited, deleted = check_app_path(count, seed)
+    checked = time.perf_counter() - start
+
+    workload = list(generate_workload(count, seed))
+    cents, cents_rate = timed(cents_path, workload)
+    floats, float_rate = timed(float_path, workload)
+    decimals, decimal_rate = timed(decimal_path, workload)
+
+    print(f"expenses={count} seed={seed}  zero-drift check passed ({edited} edits, {deleted} deletes) in {checked:.0f}s")
+    print(f"  cents:   {cents_rate:>12,.0f} expenses/s   balance sum = {sum(cents.values())} cents")
+    print(f"  float:   {float_rate:>12,.0f} expenses/s   balance sum = {sum(floats.values()):.10f} dollars")
+    print(f"  decimal: {decimal_rate:>12,.0f} expenses/s   balance sum = {sum(decimals.values())} dollars")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,55 @@
+"""Render cost of the index and expense pages: cold, warm from the render cache, and 304s.
+
+Usage: python benchmarks/bench_render.py [expenses] [requests]   (defaults: 10000 300)
+Cold clears the render cache before every request; warm renders the same page again with the
+fragments cached; 304 sends the previous ETag back, so nothing is rendered at all.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["SPLITWISE_DATABASE"] = os.path.join(tempfile.mkdtemp(), "render.db")
+
+import app as splitwise
+from synthetic import LedgerSpec, generate
+
+
+def measure(client, url, requests, status, before=None, headers=None):
+    samples = []
+    for _ in range(requests):
+        if before:
+            before()
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == status, response.status_code
+    return samples
+
+
+def main(expenses, requests):
+    splitwise.repository.add_many(list(generate(LedgerSpec(expenses=expenses))))
+    client = splitwise.app.test_client()
+    expense_id = client.get("/api/expenses").json["expenses"][0]["id"]
+
+    print(f"{'page':>10} {'mode':>6} {'median (ms)':>12} {'req/s':>10}")
+    for label, url in (("index", "/"), ("expense", f"/expense/{expense_id}")):
+        etag = client.get(url).headers["ETag"]
+        for mode, kwargs in (
+            ("cold", dict(status=200, before=splitwise.render_cache.clear)),
+            ("warm", dict(status=200)),
+            ("304", dict(status=304, headers={"If-None-Match": etag})),
+        ):
+            samples = measure(client, url, requests, **kwargs)
+            print(f"{label:>10} {mode:>6} {statistics.median(samples) * 1e3:>12.3f} {len(samples) / sum(samples):>10.0f}")
+    cache = splitwise.render_cache
+    print(f"render cache: {len(cache)} entries, {cache.size / 1024:.0f} KiB, {cache.hits} hits, {cache.misses} misses")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, int(sys.argv[2]) if len(sys.argv) > 2 else 300)
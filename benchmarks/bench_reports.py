@@ -0,0 +1,53 @@
+"""Latency of spending reports answered from the rollups, as the number of expenses grows.
+
+Usage: python benchmarks/bench_reports.py [sizes...]   (default: 10000 100000 1000000)
+Pass 10000000 for the 10M case; building it takes a while and several GB of memory.
+Expenses are one minute apart, so 1M expenses cover about two years of daily buckets.
+"""
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rollups import SpendingRollups
+from synthetic import LedgerSpec, generate
+
+CATEGORIES = ["Food", "Transport", "Entertainment", "Shopping", "Bills"]
+QUERIES = [
+    ("Veer, Food, one year", lambda r: r.total(date(2024, 1, 1), date(2024, 12, 31), "Veer", "Food")),
+    ("everyone, by month", lambda r: r.breakdown(date.min, date.max, "month")),
+    ("Veer, by day, one month", lambda r: r.breakdown(date(2024, 3, 1), date(2024, 3, 31), "day", "Veer")),
+]
+
+
+def main(sizes):
+    print(f"{'expenses':>10} {'build (s)':>10} {'query':>26} {'cold (ms)':>10} {'warm (ms)':>10}")
+    for size in sizes:
+        rng = random.Random(1)
+        rollups = SpendingRollups()
+        start = time.perf_counter()
+        last = None
+        for expense in generate(LedgerSpec(expenses=size)):
+            expense.category = rng.choice(CATEGORIES)
+            rollups.record(expense)
+            last = expense
+        build = time.perf_counter() - start
+
+        for label, query in QUERIES:
+            # Re-recording an expense invalidates the prefix sums, as a write would
+            rollups.record(last)
+            start = time.perf_counter()
+            query(rollups)
+            cold = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(100):
+                query(rollups)
+            warm = (time.perf_counter() - start) / 100
+            print(f"{size:>10} {build:>10.1f} {label:>26} {cold * 1e3:>10.3f} {warm * 1e3:>10.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
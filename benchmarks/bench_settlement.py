@@ -0,0 +1,60 @@
+"""Compare transfer counts and runtime of the greedy and exact settlement strategies.
+
+Usage: python benchmarks/bench_settlement.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from settlement import EXACT_SOLVER_LIMIT, settle_up
+
+
+def make_balances(count, seed=0):
+    """Random balances in whole cents that sum to exactly zero, with some small zero-sum clusters"""
+    rng = random.Random(seed)
+    balances = {}
+    index = 0
+    while index < count:
+        size = min(rng.randint(2, 4), count - index)
+        if count - index - size == 1:
+            # Never leave a single user behind; their balance could not sum to zero
+            size += 1
+        amounts = [rng.randint(-50000, 50000) for _ in range(size - 1)]
+        amounts.append(-sum(amounts))
+        for amount in amounts:
+            balances[f"user{index}"] = amount
+            index += 1
+    return {name: cents / 100 for name, cents in balances.items()}
+
+
+def check(balances, transfers):
+    remaining = dict(balances)
+    for debtor, creditor, amount in transfers:
+        remaining[debtor] += amount
+        remaining[creditor] -= amount
+    assert all(abs(amount) < 0.005 for amount in remaining.values()), "transfers do not settle the group"
+
+
+def run(balances, strategy):
+    start = time.perf_counter()
+    transfers = settle_up(balances, strategy=strategy)
+    elapsed = time.perf_counter() - start
+    check(balances, transfers)
+    return len(transfers), elapsed
+
+
+def main():
+    print(f"{'users':>6} {'strategy':>8} {'transfers':>10} {'time (ms)':>10}")
+    for count in (4, 8, EXACT_SOLVER_LIMIT, 100, 1000, 10000):
+        balances = make_balances(count)
+        strategies = ("greedy", "exact") if count <= EXACT_SOLVER_LIMIT else ("greedy",)
+        for strategy in strategies:
+            transfers, elapsed = run(balances, strategy)
+            print(f"{count:>6} {strategy:>8} {transfers:>10} {elapsed * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Benchmark harness for the split and balance code paths, with regression checks.
+
+Usage: python benchmarks/harness.py [--scales 1000 10000 100000] [--users 50]
+                                    [--participants 2 5] [--unequal-splits 0.3]
+                                    [--unequal-payments 0.2] [--external-payers 0.05]
+                                    [--seed 0] [--output results.json]
+                                    [--baseline benchmarks/baseline.json] [--threshold 0.25]
+                                    [--save-baseline]
+
+For each scale (number of expenses) a fresh process builds a synthetic ledger with
+synthetic.py, loads it into an in-memory app and times:
+
+    calculate_splits, get_balance_summary     per expense, over a sample of the ledger
+    get_user_net_balance, get_user_relationships
+                                              the app's balance helpers for Veer
+    GET / (warm), GET / (cold)                the home page with the render cache kept / cleared
+    GET /api/balances                         everyone's balances as JSON
+
+Each result is the best of several timed runs, in microseconds per call. Results are written
+as JSON and compared with the baseline, which holds each benchmark's median time over several
+runs in separate processes and their spread (its noise, the median absolute deviation scaled
+to a standard deviation, relative to the median). A benchmark regresses when it is slower than
+the baseline by more than the threshold (25% by default) plus its noise, with the noise capped
+at half the threshold so a noisy benchmark still fails well short of twice as slow; a scale
+with a regression is measured twice more, and the run fails if the median of its three runs
+is still too slow.
+--save-baseline takes the runs and stores them as the new baseline instead. Baselines depend
+on the machine, so record one where the checks run.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import LedgerSpec, generate
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+REPEATS = 7
+SAMPLE_SIZE = 1000
+# Roughly how long each timed run should take, so cheap calls are repeated enough to measure
+TARGET_RUN_SECONDS = 0.1
+# Scales with a regression are measured this many more times and judged on the median of all
+# their runs, like the baseline, so a burst of load on the machine is not reported as a slowdown
+CONFIRM_RUNS = 2
+# Runs per scale behind a baseline; their spread is the noise allowed on top of the threshold
+BASELINE_RUNS = 7
+# The noise allowed on top of the threshold is at most this share of the threshold
+MAX_NOISE_SHARE = 0.5
+
+
+def best_time(function, repeats=REPEATS):
+    """Best of repeats timed runs of function, in microseconds per call"""
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= TARGET_RUN_SECONDS or number >= 10 ** 6:
+            break
+        number *= 10
+    return min(timer.repeat(repeats, number)) / number * 1e6
+
+
+def run_scale(spec, results):
+    """Build one ledger and time every benchmark on it; runs in its own process"""
+    os.environ["SPLITWISE_DATABASE"] = "memory"
+    import app as splitwise
+
+    expenses = list(generate(spec))
+    splitwise.repository.add_many(expenses)
+    client = splitwise.app.test_client()
+    client.get("/")  # catch the indexes up and warm the caches
+    sample = expenses[-SAMPLE_SIZE:]
+    user = splitwise.CURRENT_USER
+
+    def each(method):
+        def run():
+            for expense in sample:
+                method(expense)
+        return run
+
+    def cold_index():
+        splitwise.render_cache.clear()
+        client.get("/")
+
+    timings = {
+        "calculate_splits": best_time(each(lambda expense: expense.calculate_splits())) / len(sample),
+        "get_balance_summary": best_time(each(lambda expense: expense.get_balance_summary())) / len(sample),
+        "get_user_net_balance": best_time(lambda: splitwise.get_user_net_balance(user)),
+        "get_user_relationships": best_time(lambda: splitwise.get_user_relationships(user)),
+        "GET / (warm)": best_time(lambda: client.get("/")),
+        "GET / (cold)": best_time(cold_index),
+        "GET /api/balances": best_time(lambda: client.get("/api/balances")),
+    }
+    results.put(timings)
+
+
+def run(specs):
+    """{"<expenses>/<benchmark>": microseconds per call} over every spec"""
+    context = multiprocessing.get_context("spawn")
+    measured = {}
+    for spec in specs:
+        results = context.Queue()
+        process = context.Process(target=run_scale, args=(spec, results))
+        start = time.perf_counter()
+        process.start()
+        timings = results.get()
+        process.join()
+        if process.exitcode:
+            raise RuntimeError(f"benchmark process for {spec.expenses} expenses failed")
+        print(f"{spec.expenses} expenses: done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        for name, micros in timings.items():
+            measured[f"{spec.expenses}/{name}"] = round(micros, 3)
+    return measured
+
+
+def scale_of(name):
+    return int(name.split("/")[0])
+
+
+def keep_median(measured, again):
+    for name in again[0]:
+        measured[name] = round(statistics.median([measured[name]] + [results[name] for results in again]), 3)
+
+
+def allowed(name, noise, threshold):
+    """Largest slowdown tolerated for a benchmark: the threshold plus its baseline noise, capped"""
+    return threshold + min(noise.get(name, 0.0), threshold * MAX_NOISE_SHARE)
+
+
+def regressions(measured, baseline, noise, threshold):
+    """Names of the benchmarks slower than their baseline by more than they are allowed to be"""
+    return [name for name, micros in measured.items()
+            if name in baseline and micros / baseline[name] - 1 > allowed(name, noise, threshold)]
+
+
+def print_comparison(measured, baseline, noise, threshold):
+    print(f"{'benchmark':<40} {'us/call':>12} {'baseline':>12} {'change':>8} {'allowed':>8}")
+    for name, micros in measured.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<40} {micros:>12.3f} {'-':>12}")
+            continue
+        change, limit = micros / before - 1, allowed(name, noise, threshold)
+        flag = "  REGRESSION" if change > limit else ""
+        print(f"{name:<40} {micros:>12.3f} {before:>12.3f} {change:>+8.0%} {limit:>+8.0%}{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000], help="Expenses per ledger")
+    parser.add_argument("--users", type=int, default=LedgerSpec.users)
+    parser.add_argument("--participants", type=int, nargs=2, metavar=("MIN", "MAX"),
+                        default=[LedgerSpec.min_participants, LedgerSpec.max_participants])
+    parser.add_argument("--unequal-splits", type=float, default=LedgerSpec.unequal_split_share)
+    parser.add_argument("--unequal-payments", type=float, default=LedgerSpec.unequal_payment_share)
+    parser.add_argument("--external-payers", type=float, default=LedgerSpec.external_payer_share)
+    parser.add_argument("--seed", type=int, default=LedgerSpec.seed)
+    parser.add_argument("--output", help="Write the results as JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown against the baseline, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Measure {BASELINE_RUNS} times and store the results as the baseline")
+    args = parser.parse_args(argv)
+
+    specs = [
+        LedgerSpec(users=args.users, expenses=scale, min_participants=args.participants[0],
+                   max_participants=args.participants[1], unequal_split_share=args.unequal_splits,
+                   unequal_payment_share=args.unequal_payments, external_payer_share=args.external_payers,
+                   seed=args.seed)
+        for scale in args.scales
+    ]
+    measured = run(specs)
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "specs": [spec.to_dict() for spec in specs],
+        "results": measured,
+    }
+    if args.save_baseline:
+        runs = [measured] + [run(specs) for _ in range(BASELINE_RUNS - 1)]
+        report["results"], report["noise"] = {}, {}
+        for name in measured:
+            times = [results[name] for results in runs]
+            median = statistics.median(times)
+            # 1.4826 scales the median absolute deviation to a standard deviation for normal data;
+            # unlike the full range, one run disturbed by the machine barely moves it
+            deviation = 1.4826 * statistics.median(abs(micros - median) for micros in times)
+            report["results"][name] = round(median, 3)
+            report["noise"][name] = round(deviation / median, 3)
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    baseline, noise = {}, {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            stored = json.load(file)
+        # Only scales whose ledger was generated the same way are comparable
+        stored_specs = {spec["expenses"]: spec for spec in stored["specs"]}
+        same = {spec.expenses for spec in specs if stored_specs.get(spec.expenses) == spec.to_dict()}
+        baseline = {name: micros for name, micros in stored["results"].items() if scale_of(name) in same}
+        noise = stored.get("noise", {})
+    slower = {scale_of(name) for name in regressions(measured, baseline, noise, args.threshold)}
+    if slower:
+        print(f"re-measuring {', '.join(map(str, sorted(slower)))} expenses to confirm a slowdown", file=sys.stderr)
+        keep_median(measured, [run([spec for spec in specs if spec.expenses in slower]) for _ in range(CONFIRM_RUNS)])
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    print_comparison(measured, baseline, noise, args.threshold)
+    failed = regressions(measured, baseline, noise, args.threshold)
+    if failed:
+        print(f"FAIL: {len(failed)} benchmark(s) slower than the baseline by more than they are allowed")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
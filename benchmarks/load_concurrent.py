@@ -0,0 +1,160 @@
+"""Load test: several worker processes hammering the write routes of one shared SQLite database.
+
+Usage: python benchmarks/load_concurrent.py [workers] [threads per worker] [operations per thread]
+       (defaults: 4 workers x 2 threads x 150 operations)
+
+Each worker process imports the app on its own, like a gunicorn worker, and its threads add,
+edit and delete expenses through the Flask test client. Edits target a small shared set of
+expenses so that workers regularly collide. Afterwards the seeding process (which only catches
+up through the change feed) and a freshly started worker check their in-memory ledgers against
+a full recompute from the database, and the run fails unless all balances are exact.
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERS = ["Veer", "Ann", "Bob", "Cleo", "Dev", "Eli", "Fay"]
+HOT_EXPENSES = 10
+
+
+def random_form(rng):
+    names = rng.sample(USERS, rng.randint(2, 5))
+    payers = rng.sample(names, rng.randint(1, 2))
+    # Amounts that do not divide evenly, so any cent lost in a split shows up in the balances
+    return dict(
+        title="Load test", amount=f"{rng.randint(1, 50000) / 100:.2f}", paid_by=", ".join(payers),
+        participants=", ".join(names), split_type="equal", payment_type="equal", category="Load",
+    )
+
+
+def run_thread(splitwise, hot_ids, operations, seed, outcomes):
+    """Fills outcomes (a Counter of its own) with how each write went"""
+    rng = random.Random(seed)
+    client = splitwise.app.test_client()
+    for _ in range(operations):
+        roll = rng.random()
+        if 0.4 <= roll < 0.85:
+            expense_id = rng.choice(hot_ids)
+            # Read the version the way a browser would get it: from the rendered edit form
+            expense = splitwise.repository.get(expense_id)
+            form = dict(random_form(rng), version=str(expense.version))
+            time.sleep(rng.random() / 1000)  # think time, so other workers get in between
+            response = client.post(f"/edit_expense/{expense_id}", data=form)
+            location = response.headers.get("Location", "")
+            outcome = "edited" if "/expense/" in location else "edit conflict" if "/edit_expense/" in location else "edit failed"
+            outcomes[outcome] += 1
+            continue
+        # Delete one of the newest expenses (whoever added it), or add one if there are none
+        newest, _ = splitwise.repository.page(None, 20)
+        candidates = [expense.id for expense in newest if expense.id not in hot_ids]
+        if roll >= 0.85 and candidates:
+            response = client.post(f"/delete_expense/{rng.choice(candidates)}")
+            outcomes["deleted" if response.status_code == 302 else "delete failed"] += 1
+        else:
+            response = client.post("/add_expense", data=random_form(rng))
+            outcomes["added" if response.status_code == 302 else "add failed"] += 1
+
+
+def run_worker(database, worker, threads, operations, results):
+    os.environ["SPLITWISE_DATABASE"] = database
+    import app as splitwise
+
+    hot_ids = [expense.id for expense in splitwise.repository.list()[:HOT_EXPENSES]]
+    outcomes = [Counter() for _ in range(threads)]
+    pool = [
+        threading.Thread(target=run_thread, args=(splitwise, hot_ids, operations, worker * 1000 + index, outcomes[index]))
+        for index in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((worker, dict(sum(outcomes, Counter()))))
+
+
+def verify_worker(database, results):
+    """A worker started after the run must load exactly what the database holds"""
+    os.environ["SPLITWISE_DATABASE"] = database
+    import app as splitwise
+
+    splitwise.app.test_client().get("/api/settle")
+    expenses = splitwise.repository.list()
+    invalid = [e.id for e in expenses if not e.validate_payments() or sum(round(p.amount_owed * 100) for p in e.participants) != round(e.amount * 100)]
+    results.put((splitwise.group_ledgers.verify(expenses), sum(splitwise.group_ledgers.balances_cents().values()), invalid))
+
+
+def main(argv):
+    workers = int(argv[1]) if len(argv) > 1 else 4
+    threads = int(argv[2]) if len(argv) > 2 else 2
+    operations = int(argv[3]) if len(argv) > 3 else 150
+    database = os.path.join(tempfile.mkdtemp(), "concurrent.db")
+
+    os.environ["SPLITWISE_DATABASE"] = database
+    import app as splitwise
+    from eventlog import balances_at
+    seed_client = splitwise.app.test_client()
+    rng = random.Random(0)
+    for _ in range(HOT_EXPENSES):
+        seed_client.post("/add_expense", data=random_form(rng))
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start = time.perf_counter()
+    processes = [context.Process(target=run_worker, args=(database, worker, threads, operations, results)) for worker in range(workers)]
+    for process in processes:
+        process.start()
+    outcomes = Counter()
+    for _ in processes:
+        outcomes.update(results.get()[1])
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    total = workers * threads * operations
+    print(f"{workers} workers x {threads} threads x {operations} operations: {total} writes in {elapsed:.2f}s ({total / elapsed:.0f}/s)")
+    for outcome, count in sorted(outcomes.items()):
+        print(f"  {outcome:14s} {count}")
+
+    # The seeding process has been idle throughout; it must catch up purely from the change feed
+    seed_client.get("/")
+    expenses = splitwise.repository.list()
+    failures = []
+    drift = splitwise.group_ledgers.verify(expenses)
+    if drift:
+        failures.append(f"seeding process ledger drifted: {drift}")
+    process = context.Process(target=verify_worker, args=(database, results))
+    process.start()
+    fresh_drift, fresh_total, invalid = results.get()
+    process.join()
+    if fresh_drift:
+        failures.append(f"fresh worker ledger drifted: {fresh_drift}")
+    if fresh_total != 0 or sum(splitwise.group_ledgers.balances_cents().values()) != 0:
+        failures.append("balances do not sum to zero")
+    if invalid:
+        failures.append(f"{len(invalid)} stored expenses do not add up")
+    # Replaying the event log must land on the same balances, which only holds if every
+    # worker's events were appended in commit order
+    if balances_at(splitwise.repository.event_log, time.time()) != splitwise.group_ledgers.balances():
+        failures.append("event log replay disagrees with the database")
+    if any(outcome.endswith("failed") for outcome in outcomes):
+        failures.append("some writes failed")
+
+    print(f"{len(expenses)} expenses stored, {splitwise.synced_change} changes in the feed")
+    if failures:
+        for failure in failures:
+            print("FAIL:", failure)
+        return 1
+    print("OK: every ledger matches the database to the cent")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
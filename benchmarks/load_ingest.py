@@ -0,0 +1,140 @@
+"""Load generator for the JSON write API: expenses committed per second over real HTTP.
+
+Usage: python benchmarks/load_ingest.py [--url http://host:port] [--clients 16]
+                                        [--batch 100] [--seconds 10] [--group default]
+
+Without --url it starts the app on a throwaway SQLite database in a separate process, with
+Werkzeug's threaded server, and aims at that. Each client thread keeps one HTTP/1.1 connection
+and posts batches of --batch random expenses (--batch 1 posts single objects) for --seconds,
+then the run reports committed expenses per second and request latency percentiles.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERS = ["Veer", "Ann", "Bob", "Cleo", "Dev", "Eli", "Fay"]
+
+
+def random_expense(rng):
+    names = rng.sample(USERS, rng.randint(2, 5))
+    return {
+        "title": "Ingest", "amount": rng.randint(1, 50000) / 100, "paid_by": rng.sample(names, rng.randint(1, 2)),
+        "participants": names, "category": "Load",
+    }
+
+
+def serve(database, port):
+    os.environ["SPLITWISE_DATABASE"] = database
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as splitwise
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    make_server("127.0.0.1", port, splitwise.app, threaded=True, request_handler=KeepAliveHandler).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def run_client(host, port, path, batch, deadline, seed, results):
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port)
+    latencies, committed, failed = [], 0, 0
+    while time.time() < deadline:
+        items = [random_expense(rng) for _ in range(batch)]
+        body = json.dumps(items[0] if batch == 1 else items)
+        start = time.perf_counter()
+        connection.request("POST", path, body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status == 201:
+            committed += batch
+        else:
+            failed += 1
+    connection.close()
+    results.append((latencies, committed, failed))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--group", default="default")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = "127.0.0.1", free_port()
+        database = os.path.join(tempfile.mkdtemp(), "ingest.db")
+        server = multiprocessing.get_context("spawn").Process(target=serve, args=(database, port), daemon=True)
+        server.start()
+    wait_until_up(host, port)
+    path = "/api/expenses" if args.group == "default" else f"/g/{args.group}/api/expenses"
+
+    results = []
+    start = time.time()
+    deadline = start + args.seconds
+    threads = [
+        threading.Thread(target=run_client, args=(host, port, path, args.batch, deadline, seed, results))
+        for seed in range(args.clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    if server is not None:
+        server.terminate()
+
+    latencies = [latency for samples, _, _ in results for latency in samples]
+    committed = sum(count for _, count, _ in results)
+    failed = sum(count for _, _, count in results)
+    print(f"{args.clients} clients x batches of {args.batch}: {committed} expenses committed in {elapsed:.1f}s "
+          f"({committed / elapsed:,.0f}/s), {len(latencies)} requests, {failed} failed")
+    print(f"request latency ms: p50 {percentile(latencies, 0.5) * 1e3:.1f}  p99 {percentile(latencies, 0.99) * 1e3:.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""Load test: latency of the first vs the thousandth page of the index and /api/expenses.
+
+Usage: python benchmarks/load_pagination.py [requests]   (default: 200 per page)
+Builds a throwaway SQLite database with just over 1000 pages of history.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ["SPLITWISE_DATABASE"] = os.path.join(tempfile.mkdtemp(), "load.db")
+
+import app as splitwise
+from synthetic import LedgerSpec, generate
+
+PAGES = 1000
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(client, url, requests):
+    client.get(url)  # warm up template and statement caches
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+    return samples
+
+
+def main(requests):
+    start_date = datetime(2020, 1, 1)
+    for index, expense in enumerate(generate(LedgerSpec(expenses=splitwise.PAGE_SIZE * PAGES + 10))):
+        expense.date = start_date + timedelta(minutes=index)
+        splitwise.repository.add(expense)
+
+    client = splitwise.app.test_client()
+    cursor = None
+    for _ in range(PAGES - 1):
+        cursor = client.get("/api/expenses", query_string={"limit": splitwise.PAGE_SIZE, **({"cursor": cursor} if cursor else {})}).json["next_cursor"]
+
+    targets = [
+        ("index page 1", "/"),
+        (f"index page {PAGES}", f"/?cursor={cursor}"),
+        ("api page 1", "/api/expenses"),
+        (f"api page {PAGES}", f"/api/expenses?cursor={cursor}"),
+    ]
+    print(f"{'target':>18} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for label, url in targets:
+        samples = measure(client, url, requests)
+        print(f"{label:>18} {statistics.median(samples) * 1e3:>9.2f} {percentile(samples, 0.99) * 1e3:>9.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,84 @@
+"""Seeded generator of synthetic ledgers for the benchmarks.
+
+LedgerSpec sets the shape of the ledger: how many users and expenses, how many people share
+each expense, how often splits and payments are unequal and how often someone outside the
+expense pays for it. The same spec and seed always produce the same expenses, ids included,
+and every generated expense balances to the cent.
+"""
+import random
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from models import DEFAULT_GROUP, Expense, Participant, PaymentType, SplitType
+from money import from_cents, split_evenly
+
+CATEGORIES = ["Food", "Transport", "Entertainment", "Shopping", "Bills", None]
+
+
+@dataclass
+class LedgerSpec:
+    users: int = 50
+    expenses: int = 10000
+    min_participants: int = 2
+    max_participants: int = 5
+    max_payers: int = 2
+    unequal_split_share: float = 0.3  # Fraction of expenses with unequal splits
+    unequal_payment_share: float = 0.2  # Fraction with unequal payments (of those with several payers)
+    external_payer_share: float = 0.05  # Fraction where one payer is not a participant
+    groups: int = 1
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def make_users(count: int) -> List[str]:
+    """Veer (the app's current user) plus count - 1 others"""
+    return ["Veer"] + [f"user{i}" for i in range(count - 1)]
+
+
+def _random_parts(rng: random.Random, total: int, count: int) -> List[int]:
+    """total cents cut at random points into count parts"""
+    cuts = sorted(rng.randint(0, total) for _ in range(count - 1))
+    return [end - start for start, end in zip([0] + cuts, cuts + [total])]
+
+
+def generate(spec: LedgerSpec, users: Optional[List[str]] = None) -> Iterator[Expense]:
+    """spec.expenses expenses one minute apart, oldest first, between the given users
+    (by default make_users(spec.users))"""
+    rng = random.Random(spec.seed)
+    users = users or make_users(spec.users)
+    start = datetime(2024, 1, 1)
+    for index in range(spec.expenses):
+        cents = rng.randint(100, 50000)
+        names = rng.sample(users, min(len(users), rng.randint(spec.min_participants, spec.max_participants)))
+        payers = rng.sample(names, rng.randint(1, min(spec.max_payers, len(names))))
+        if len(names) < len(users) and rng.random() < spec.external_payer_share:
+            outsiders = [name for name in rng.sample(users, min(len(users), len(names) + 1)) if name not in names]
+            payers[-1] = outsiders[0]
+
+        split_type = SplitType.UNEQUAL if rng.random() < spec.unequal_split_share else SplitType.EQUAL
+        payment_type = PaymentType.UNEQUAL if len(payers) > 1 and rng.random() < spec.unequal_payment_share else PaymentType.EQUAL
+        paid = split_evenly(cents, len(payers)) if payment_type == PaymentType.EQUAL else _random_parts(rng, cents, len(payers))
+
+        expense = Expense(
+            id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            title=f"Expense {index}",
+            amount=from_cents(cents),
+            paid_by=", ".join(payers),
+            participants=[Participant(name=name) for name in names],
+            split_type=split_type,
+            payment_type=payment_type,
+            date=start + timedelta(minutes=index),
+            category=rng.choice(CATEGORIES),
+            group_id=f"group{rng.randrange(spec.groups)}" if spec.groups > 1 else DEFAULT_GROUP,
+        )
+        expense.set_payments({payer: from_cents(share) for payer, share in zip(payers, paid)})
+        if split_type == SplitType.UNEQUAL:
+            for participant, share in zip(expense.participants, _random_parts(rng, cents, len(names))):
+                participant.amount_owed = from_cents(share)
+        else:
+            expense.calculate_splits()
+        yield expense
@@ -0,0 +1,171 @@
+"""Compact, memory-lean representation of expenses for processes that hold millions of them.
+
+CompactExpense uses __slots__ instead of a per-instance __dict__, refers to participants
+by integer ids from a shared NameTable rather than repeating name strings, and keeps the
+owed and paid amounts as integer cents in one packed array (all owed amounts, then all
+paid amounts).
+participants is a list of thin views over that array, so code written against
+Expense/Participant keeps working unchanged.
+"""
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from models import DEFAULT_GROUP, Expense, Participant, PaymentType, SplitType
+from money import from_cents, split_evenly, to_cents
+
+
+class NameTable:
+    """Interns participant names to small integer ids"""
+
+    __slots__ = ('_ids', '_names')
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def id_for(self, name: str) -> int:
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return name_id
+
+    def name(self, name_id: int) -> str:
+        return self._names[name_id]
+
+    def __len__(self):
+        return len(self._names)
+
+
+DEFAULT_NAMES = NameTable()
+
+
+class CompactParticipant:
+    """View of one participant slot inside a CompactExpense"""
+
+    __slots__ = ('_expense', '_index')
+
+    def __init__(self, expense: 'CompactExpense', index: int):
+        self._expense = expense
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        return self._expense._table.name(self._expense._name_ids[self._index])
+
+    @property
+    def amount_owed(self) -> float:
+        return from_cents(self._expense._amounts[self._index])
+
+    @amount_owed.setter
+    def amount_owed(self, value: float):
+        self._expense._amounts[self._index] = to_cents(value)
+
+    @property
+    def amount_paid(self) -> float:
+        return from_cents(self._expense._amounts[len(self._expense._name_ids) + self._index])
+
+    @amount_paid.setter
+    def amount_paid(self, value: float):
+        self._expense._amounts[len(self._expense._name_ids) + self._index] = to_cents(value)
+
+    def __repr__(self):
+        return f"CompactParticipant(name={self.name!r}, amount_owed={self.amount_owed!r}, amount_paid={self.amount_paid!r})"
+
+
+class CompactExpense:
+    """Drop-in replacement for Expense with the same attributes and methods"""
+
+    __slots__ = (
+        'id', 'title', 'amount', 'paid_by', 'split_type', 'date', 'category', 'payment_type',
+        'version', 'group_id', '_external', '_table', '_name_ids', '_amounts',
+    )
+
+    def __init__(self, id: str, title: str, amount: float, paid_by: str, participants: List[Participant],
+                 split_type: SplitType, date: datetime, category: Optional[str] = None,
+                 external_payments: Dict[str, float] = None, payment_type: PaymentType = PaymentType.EQUAL,
+                 version: int = 0, group_id: str = DEFAULT_GROUP, names: NameTable = DEFAULT_NAMES):
+        self.id = id
+        self.title = title
+        self.amount = amount
+        self.paid_by = paid_by
+        self.split_type = split_type
+        self.date = date
+        self.category = category
+        self.payment_type = payment_type
+        self.version = version
+        self.group_id = group_id
+        self._table = names
+        # Most expenses have no external payers, so skip allocating an empty dict for them
+        self._external = external_payments or None
+        self.participants = participants
+
+    @classmethod
+    def from_expense(cls, expense: Expense, names: NameTable = DEFAULT_NAMES) -> 'CompactExpense':
+        return cls(
+            id=expense.id, title=expense.title, amount=expense.amount, paid_by=expense.paid_by,
+            participants=expense.participants, split_type=expense.split_type, date=expense.date,
+            category=expense.category, external_payments=dict(expense.external_payments),
+            payment_type=expense.payment_type, version=expense.version, group_id=expense.group_id, names=names,
+        )
+
+    def to_expense(self) -> Expense:
+        return Expense(
+            id=self.id, title=self.title, amount=self.amount, paid_by=self.paid_by,
+            participants=[Participant(name=p.name, amount_owed=p.amount_owed, amount_paid=p.amount_paid) for p in self.participants],
+            split_type=self.split_type, date=self.date, category=self.category,
+            external_payments=dict(self.external_payments), payment_type=self.payment_type,
+            version=self.version, group_id=self.group_id,
+        )
+
+    @property
+    def participants(self) -> List[CompactParticipant]:
+        return [CompactParticipant(self, index) for index in range(len(self._name_ids))]
+
+    @participants.setter
+    def participants(self, participants):
+        participants = list(participants)
+        self._name_ids = array('i', (self._table.id_for(p.name) for p in participants))
+        self._amounts = array('q', [to_cents(p.amount_owed) for p in participants] + [to_cents(p.amount_paid) for p in participants])
+
+    @property
+    def external_payments(self) -> Dict[str, float]:
+        if self._external is None:
+            self._external = {}
+        return self._external
+
+    @external_payments.setter
+    def external_payments(self, value: Dict[str, float]):
+        self._external = value or None
+
+    def participant_names(self) -> List[str]:
+        return [self._table.name(name_id) for name_id in self._name_ids]
+
+    def calculate_splits(self):
+        if self.split_type == SplitType.EQUAL:
+            count = len(self._name_ids)
+            self._amounts[:count] = array('q', split_evenly(to_cents(self.amount), count))
+
+    def get_balance_summary_cents(self) -> Dict[str, int]:
+        # Same result as Expense.get_balance_summary_cents, read straight off the array
+        balances = {}
+        count = len(self._name_ids)
+        for name_id, owed, paid in zip(self._name_ids, self._amounts[:count], self._amounts[count:]):
+            balances[self._table.name(name_id)] = paid - owed
+        if self._external:
+            for payer_name, amount_paid in self._external.items():
+                balances[payer_name] = balances.get(payer_name, 0) + to_cents(amount_paid)
+        return balances
+
+    def __repr__(self):
+        return (f"CompactExpense(id={self.id!r}, title={self.title!r}, amount={self.amount!r}, "
+                f"paid_by={self.paid_by!r}, participants={self.participants!r})")
+
+    # The remaining behaviour only goes through the public attributes, so share Expense's code
+    get_balance_summary = Expense.get_balance_summary
+    to_dict = Expense.to_dict
+    set_payments = Expense.set_payments
+    validate_payments = Expense.validate_payments
+    validate_unequal_payments = Expense.validate_unequal_payments
+    validate_unequal_splits = Expense.validate_unequal_splits
@@ -0,0 +1,146 @@
+import bisect
+import heapq
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set, Tuple
+
+from models import Expense
+
+# Prefixes matching more names than this are answered by walking the usage buckets
+# from the most used down instead of ranking every match
+RANGE_SCAN_LIMIT = 500
+SEARCH_CACHE_SIZE = 1024
+
+
+def expense_names(expense: Expense) -> Set[str]:
+    """Everyone involved in an expense: participants, each listed payer, and external payers"""
+    names = {p.name for p in expense.participants}
+    names.update(name.strip() for name in expense.paid_by.split(',') if name.strip())
+    names.update(expense.external_payments)
+    return names
+
+
+def _prefix_range(entries: List[Tuple[str, str]], key: str) -> Tuple[int, int]:
+    """Index range of sorted (casefolded name, name) entries whose name starts with key"""
+    # Every casefolded name with this prefix sorts below prefix + U+10FFFF
+    return bisect.bisect_left(entries, (key,)), bisect.bisect_left(entries, (key + '\U0010ffff',))
+
+
+class ParticipantDirectory:
+    """Names seen across expenses with how many expenses each appears in, for autocomplete"""
+
+    def __init__(self):
+        self._usage: Dict[str, int] = {}
+        # (casefolded name, name), sorted for prefix range lookups
+        self._by_name: List[Tuple[str, str]] = []
+        # Usage count -> that count's names as sorted (casefolded name, name), plus the
+        # sorted list of counts in use, so names can be read most used first per prefix
+        self._buckets: Dict[int, List[Tuple[str, str]]] = {}
+        self._counts: List[int] = []
+        self._contributions: Dict[str, Set[str]] = {}
+        self._cache: OrderedDict = OrderedDict()
+        # Bumped on every change; used for cache invalidation and ETags
+        self.version = 0
+
+    def _move(self, entry: Tuple[str, str], old_count: int, new_count: int):
+        if old_count:
+            bucket = self._buckets[old_count]
+            del bucket[bisect.bisect_left(bucket, entry)]
+            if not bucket:
+                del self._buckets[old_count]
+                del self._counts[bisect.bisect_left(self._counts, old_count)]
+        if new_count:
+            bucket = self._buckets.get(new_count)
+            if bucket is None:
+                bucket = self._buckets[new_count] = []
+                bisect.insort(self._counts, new_count)
+            bisect.insort(bucket, entry)
+
+    def _adjust(self, name: str, delta: int):
+        entry = (name.casefold(), name)
+        count = self._usage.get(name, 0)
+        if not count:
+            bisect.insort(self._by_name, entry)
+        self._move(entry, count, count + delta)
+        count += delta
+        if count:
+            self._usage[name] = count
+        else:
+            del self._usage[name]
+            del self._by_name[bisect.bisect_left(self._by_name, entry)]
+
+    def _changed(self):
+        self.version += 1
+        self._cache.clear()
+
+    def record(self, expense: Expense):
+        """Count the names of an added or edited expense, replacing its previous names if any"""
+        previous = self._contributions.get(expense.id, set())
+        names = expense_names(expense)
+        for name in previous - names:
+            self._adjust(name, -1)
+        for name in names - previous:
+            self._adjust(name, 1)
+        self._contributions[expense.id] = names
+        if previous != names:
+            self._changed()
+
+    def discard(self, expense_id: str):
+        names = self._contributions.pop(expense_id, None)
+        if names:
+            for name in names:
+                self._adjust(name, -1)
+            self._changed()
+
+    def rebuild(self, expenses: Iterable[Expense]):
+        self._usage = {}
+        self._by_name = []
+        self._buckets = {}
+        self._counts = []
+        self._contributions = {}
+        self._changed()
+        for expense in expenses:
+            self.record(expense)
+
+    def state(self) -> tuple:
+        return self._usage, self._contributions
+
+    def restore(self, state: tuple):
+        self._usage, self._contributions = state
+        self._by_name = sorted((name.casefold(), name) for name in self._usage)
+        self._buckets = {}
+        for entry in self._by_name:
+            # Appending in name order keeps every bucket sorted
+            self._buckets.setdefault(self._usage[entry[1]], []).append(entry)
+        self._counts = sorted(self._buckets)
+        self._changed()
+
+    def __len__(self):
+        return len(self._usage)
+
+    def search(self, prefix: str = '', limit: int = 10) -> List[str]:
+        """Names starting with prefix (case-insensitive), most used first"""
+        cache_key = (prefix.casefold(), limit)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            self._cache.move_to_end(cache_key)
+            return cached
+
+        key = cache_key[0]
+        start, end = _prefix_range(self._by_name, key)
+        if end - start <= RANGE_SCAN_LIMIT:
+            matches = heapq.nsmallest(limit, ((-self._usage[name], folded, name) for folded, name in self._by_name[start:end]))
+            results = [name for _, _, name in matches]
+        else:
+            # Broad prefix: take matches from the most used bucket down until we have enough
+            results = []
+            for count in reversed(self._counts):
+                bucket = self._buckets[count]
+                low, high = _prefix_range(bucket, key)
+                results.extend(name for _, name in bucket[low:min(high, low + limit - len(results))])
+                if len(results) == limit:
+                    break
+
+        self._cache[cache_key] = results
+        if len(self._cache) > SEARCH_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return results
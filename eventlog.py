@@ -0,0 +1,402 @@
+"""Append-only event log of every expense write, with snapshots for fast startup.
+
+Each add, edit and delete is appended to events.log as a length-prefixed binary record:
+
+    payload length (uint32) | CRC32 of payload (uint32) | payload
+    payload = sequence (uint64) | unix time (float64) | kind (uint8) | id length (uint16) | id | expense JSON
+
+The sequence is the change feed number the repository gave the write, so the log and the
+change feed line up. A record cut short by a crash fails its length or CRC check and is
+dropped by the next writer; a damaged record with intact ones after it is skipped instead,
+so the rest of the history survives. The log is the audit trail and allows balances to be
+replayed as of any moment.
+
+Writers serialise on flock(), so the log is only kept where fcntl is available; elsewhere
+(Windows) the repository runs without one and LOG_SUPPORTED is False.
+
+Snapshots (snapshot-<sequence>.bin next to the log) hold the pickled state of the in-memory
+indexes as of a sequence number, plus the log offset just past it. Startup maps the newest
+snapshot, restores the indexes from it and replays only the log after that offset, so restart
+time follows the size of the live data rather than the length of the history.
+
+Usage: python eventlog.py history <expense id> [--database splitwise.db]
+       python eventlog.py balances [--at 2024-06-30T18:00] [--group trip] [--database splitwise.db]
+"""
+import argparse
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from groups import GroupLedgers
+from models import Expense
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LOG_SUPPORTED = fcntl is not None
+
+ADD, EDIT, DELETE = 1, 2, 3
+KIND_NAMES = {ADD: "add", EDIT: "edit", DELETE: "delete"}
+
+LOG_NAME = "events.log"
+# A SQLite database at splitwise.db keeps its event log in splitwise.db.events/
+LOG_DIRECTORY_SUFFIX = ".events"
+SNAPSHOT_MAGIC = b"SWSNAP02"  # 01 snapshots predate per-group indexes and are ignored
+SNAPSHOTS_KEPT = 3
+
+RECORD_HEADER = struct.Struct("<II")
+EVENT_HEADER = struct.Struct("<QdBH")
+SNAPSHOT_HEADER = struct.Struct("<8sQQdI")  # magic, sequence, log offset, latest event time up to it, section count
+
+
+class Event(NamedTuple):
+    sequence: int
+    timestamp: float
+    kind: int
+    expense_id: str
+    data: bytes  # Expense.to_dict() as JSON; empty for deletes
+
+    @classmethod
+    def for_expense(cls, sequence: int, kind: int, expense: Expense, timestamp: Optional[float] = None) -> 'Event':
+        return cls(sequence, time.time() if timestamp is None else timestamp, kind, expense.id,
+                   json.dumps(expense.to_dict(), separators=(",", ":")).encode())
+
+    @classmethod
+    def for_delete(cls, sequence: int, expense_id: str, timestamp: Optional[float] = None) -> 'Event':
+        return cls(sequence, time.time() if timestamp is None else timestamp, DELETE, expense_id, b"")
+
+    def expense(self) -> Optional[Expense]:
+        return Expense.from_dict(json.loads(self.data)) if self.data else None
+
+
+def encode_event(event: Event) -> bytes:
+    expense_id = event.expense_id.encode()
+    payload = EVENT_HEADER.pack(event.sequence, event.timestamp, event.kind, len(expense_id)) + expense_id + event.data
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _intact_payload(buffer, offset: int, end: int) -> Optional[bytes]:
+    """Payload of the record at offset if it is complete and passes its CRC"""
+    if offset + RECORD_HEADER.size > end:
+        return None
+    length, checksum = RECORD_HEADER.unpack_from(buffer, offset)
+    start = offset + RECORD_HEADER.size
+    if length < EVENT_HEADER.size or start + length > end:
+        return None
+    payload = buffer[start:start + length]
+    return payload if zlib.crc32(payload) == checksum else None
+
+
+def decode_events(buffer, offset: int, end: int) -> Iterator[Tuple[Event, int]]:
+    """(event, offset just past it) for each intact record.
+
+    A record that fails its checks is skipped by scanning ahead for the next intact one, so
+    damage in the middle of the log loses only the damaged record; if nothing intact follows,
+    it is a torn tail and decoding stops there.
+    """
+    while offset < end:
+        payload = _intact_payload(buffer, offset, end)
+        if payload is None:
+            offset = next((candidate for candidate in range(offset + 1, end - RECORD_HEADER.size)
+                           if _intact_payload(buffer, candidate, end) is not None), None)
+            if offset is None:
+                return
+            continue
+        sequence, timestamp, kind, id_length = EVENT_HEADER.unpack_from(payload)
+        id_end = EVENT_HEADER.size + id_length
+        offset += RECORD_HEADER.size + len(payload)
+        yield Event(sequence, timestamp, kind, payload[EVENT_HEADER.size:id_end].decode(), payload[id_end:]), offset
+
+
+class EventLog:
+    """The events.log file in a directory, shared by every process using the same database.
+
+    Writers hold locked() around their database transaction and the append that follows it,
+    so events are in commit order. Reads never take the lock.
+
+    flock() excludes other processes but not other threads sharing this descriptor (a second
+    flock from the same process succeeds, and any thread's unlock releases it), so locked()
+    also takes a lock of the log's own to keep this process's threads out of each other's way.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, LOG_NAME)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._thread_lock = threading.Lock()
+        # Everything before _end has been checked; records before the newest snapshot were
+        # checked by whoever took it, so startup does not rescan the whole history
+        snapshot = latest_snapshot(directory)
+        self._end = snapshot.offset if snapshot else 0
+        self.last_sequence = snapshot.sequence if snapshot else 0
+
+    def close(self):
+        os.close(self._fd)
+
+    @contextmanager
+    def locked(self):
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def is_empty(self) -> bool:
+        return os.fstat(self._fd).st_size == 0
+
+    def read(self, offset: int = 0) -> Iterator[Tuple[Event, int]]:
+        """(event, offset just past it) for every complete record from offset on"""
+        with open(self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size <= offset:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from decode_events(buffer, offset, size)
+
+    def catch_up(self):
+        """Check records other processes appended since the last call; only call while locked.
+
+        Bytes after the last intact record can only be a torn record left by a writer that
+        crashed mid-append, and nothing follows them while we hold the lock, so they are cut off.
+        """
+        if os.fstat(self._fd).st_size == self._end:
+            return
+        for event, offset in self.read(self._end):
+            self.last_sequence = event.sequence
+            self._end = offset
+        if os.fstat(self._fd).st_size > self._end:
+            os.ftruncate(self._fd, self._end)
+
+    def append(self, events: Iterable[Event], sync: bool = False):
+        """Append events in one write, fsyncing the file afterwards if sync; only call while locked"""
+        events = list(events)
+        if not events:
+            return
+        self.catch_up()
+        data = b"".join(encode_event(event) for event in events)
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+        if sync:
+            os.fsync(self._fd)
+        self._end += len(data)
+        self.last_sequence = events[-1].sequence
+
+    def position_after(self, sequence: int, start: int = 0, timestamp: float = 0.0) -> Tuple[int, float]:
+        """Offset just past the last event at or before sequence, and the latest time of any event
+        up to there (start and timestamp describe a known earlier position to scan from).
+        Events are in commit order, but times come from each writer's clock and can step back."""
+        offset = start
+        for event, end in self.read(start):
+            if event.sequence > sequence:
+                break
+            offset, timestamp = end, max(timestamp, event.timestamp)
+        return offset, timestamp
+
+    def history(self, expense_id: str) -> List[Event]:
+        """Every event for one expense, oldest first (reads the whole log)"""
+        return [event for event, _ in self.read() if event.expense_id == expense_id]
+
+
+class Snapshot(NamedTuple):
+    path: str
+    sequence: int
+    offset: int
+    timestamp: float
+    section_count: int
+
+    def sections(self) -> Iterator[Tuple[str, object]]:
+        """(name, state) for each section, unpickled straight from the mapped file"""
+        with open(self.path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            buffer.seek(SNAPSHOT_HEADER.size)
+            for _ in range(self.section_count):
+                # One unpickler per section: each was pickled separately, with its own memo
+                yield pickle.load(buffer)
+
+
+def _read_snapshot_header(path: str) -> Optional[Snapshot]:
+    try:
+        with open(path, "rb") as file:
+            header = file.read(SNAPSHOT_HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < SNAPSHOT_HEADER.size:
+        return None
+    magic, sequence, offset, timestamp, section_count = SNAPSHOT_HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC:
+        return None
+    return Snapshot(path, sequence, offset, timestamp, section_count)
+
+
+def list_snapshots(directory: str) -> List[Snapshot]:
+    """Readable snapshots in the directory, oldest first"""
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith("snapshot-") and name.endswith(".bin"):
+            snapshot = _read_snapshot_header(os.path.join(directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return snapshots
+
+
+def latest_snapshot(directory: str) -> Optional[Snapshot]:
+    snapshots = list_snapshots(directory)
+    return snapshots[-1] if snapshots else None
+
+
+def write_snapshot(log: EventLog, sequence: int, sections: Dict[str, object]) -> Snapshot:
+    """Save index states that include every change up to sequence, then drop old snapshots.
+
+    sections maps a name to an index's state(), which hands out the index's own structures
+    rather than copies; they are pickled here, so call this while the indexes cannot change.
+    The file is written under a temporary name and renamed into place, so a reader never
+    sees a partial snapshot.
+    """
+    previous = latest_snapshot(log.directory)
+    if previous is None or previous.sequence > sequence:
+        previous = None
+    with log.locked():
+        # Every writer, in any process or thread, holds the lock from its commit to its append,
+        # so whatever a live writer committed up to sequence is in the log by now. A change
+        # whose writer died in between is appended later by the next writer's backfill, past
+        # this offset, so loading the snapshot still replays it.
+        offset, timestamp = log.position_after(sequence, *((previous.offset, previous.timestamp) if previous else ()))
+    path = os.path.join(log.directory, f"snapshot-{sequence:020d}.bin")
+    descriptor, temporary = tempfile.mkstemp(dir=log.directory, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, sequence, offset, timestamp, len(sections)))
+        for section in sections.items():
+            pickle.dump(section, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+    for old in list_snapshots(log.directory)[:-SNAPSHOTS_KEPT]:
+        try:
+            os.remove(old.path)
+        except FileNotFoundError:
+            pass  # another worker pruned it first
+    return _read_snapshot_header(path)
+
+
+def latest_events(events: Iterable[Tuple[Event, int]]) -> Tuple[Dict[str, Event], int, int]:
+    """Last event per expense, plus the highest sequence and the offset after the last event.
+
+    Indexes replace an expense's previous contribution whenever it is recorded, so applying
+    only each expense's final event gives the same state as applying them all.
+    """
+    latest: Dict[str, Event] = {}
+    sequence = offset = 0
+    for event, offset in events:
+        latest[event.expense_id] = event
+        sequence = event.sequence
+    return latest, sequence, offset
+
+
+def load_indexes(log: EventLog, indexes: Dict[str, object]) -> int:
+    """Restore indexes (objects with restore/record/discard) from the newest snapshot and the
+    log after it; returns the sequence they are now up to date with"""
+    snapshot = latest_snapshot(log.directory)
+    offset = sequence = 0
+    if snapshot is not None:
+        for name, state in snapshot.sections():
+            indexes[name].restore(state)
+        offset, sequence = snapshot.offset, snapshot.sequence
+    latest, last_sequence, _ = latest_events(log.read(offset))
+    for event in latest.values():
+        expense = event.expense()
+        for index in indexes.values():
+            if expense is None:
+                index.discard(event.expense_id)
+            else:
+                index.record(expense)
+    return max(sequence, last_sequence)
+
+
+def _holds_nothing_after(log: EventLog, snapshot: Snapshot, when: float) -> bool:
+    """Whether a snapshot's state includes no change made after the given unix time.
+
+    Every event before its offset must have happened by then, and so must any change it holds
+    that was only logged after the offset: a change whose writer died before logging it is
+    backfilled by the next append, so such events come first after the offset.
+    """
+    if snapshot.timestamp > when:
+        return False
+    for event, _ in log.read(snapshot.offset):
+        if event.sequence > snapshot.sequence:
+            break
+        if event.timestamp > when:
+            return False
+    return True
+
+
+def balances_at(log: EventLog, when: float, group_id: Optional[str] = None) -> Dict[str, float]:
+    """Every user's net balance in one group (or summed over all groups) as it stood at the given unix time"""
+    ledgers = GroupLedgers()
+    offset = 0
+    snapshot = next((s for s in reversed(list_snapshots(log.directory)) if _holds_nothing_after(log, s, when)), None)
+    if snapshot is not None:
+        # The ledger section is stored first, so the other sections are never unpickled
+        for name, state in snapshot.sections():
+            if name == "ledger":
+                ledgers.restore(state)
+                offset = snapshot.offset
+                break
+
+    def until(events):
+        for event, end in events:
+            if event.timestamp > when:
+                return
+            yield event, end
+
+    latest, _, _ = latest_events(until(log.read(offset)))
+    for event in latest.values():
+        expense = event.expense()
+        if expense is None:
+            ledgers.discard(event.expense_id)
+        else:
+            ledgers.record(expense)
+    return ledgers.get(group_id).balances() if group_id is not None else ledgers.balances()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("command", choices=("history", "balances"))
+    parser.add_argument("expense_id", nargs="?")
+    parser.add_argument("--at", help="ISO date/time for balances (default: now)")
+    parser.add_argument("--group", help="Balances within one group (default: totals over every group)")
+    parser.add_argument("--database", default=os.environ.get("SPLITWISE_DATABASE", "splitwise.db"))
+    args = parser.parse_args(argv)
+    if not LOG_SUPPORTED:
+        parser.error("the event log needs fcntl, which this platform does not have")
+
+    log = EventLog(args.database + LOG_DIRECTORY_SUFFIX)
+    if args.command == "history":
+        if not args.expense_id:
+            parser.error("history needs an expense id")
+        for event in log.history(args.expense_id):
+            when = datetime.fromtimestamp(event.timestamp).isoformat(timespec="seconds")
+            print(when, f"#{event.sequence}", KIND_NAMES[event.kind], event.data.decode())
+    else:
+        when = datetime.fromisoformat(args.at).timestamp() if args.at else time.time()
+        for name, amount in sorted(balances_at(log, when, args.group).items()):
+            print(f"{name}\t{amount:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Per-group partitions of the in-memory indexes.
+
+Every expense belongs to one group, and each group gets its own ledger, participant directory
+and spending rollups, so a request only ever touches the data of the group it is about however
+many groups share the process. A user's total across groups is read from the per-group ledgers
+of just the groups where they have a non-zero balance.
+"""
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+from ledger import BalanceLedger
+from models import Expense
+from money import from_cents
+
+
+class Partitioned:
+    """One index per group, with each expense routed to the index of its group.
+
+    Offers the same record/discard/rebuild/state/restore methods as the indexes it holds,
+    so it can stand in for a single index in the app and in snapshots.
+    """
+
+    def __init__(self, factory: Callable[[], object]):
+        self._factory = factory
+        self._partitions: Dict[str, object] = {}
+        self._group_of: Dict[str, str] = {}
+        # Expenses per group; a group's index is dropped with its last expense
+        self._sizes: Dict[str, int] = {}
+
+    def get(self, group_id: str):
+        """The group's index; an empty, unattached one for a group with no expenses"""
+        partition = self._partitions.get(group_id)
+        return partition if partition is not None else self._factory()
+
+    def group_of(self, expense_id: str):
+        return self._group_of.get(expense_id)
+
+    def groups(self) -> Dict[str, int]:
+        """{group id: number of expenses} for every group with any"""
+        return dict(self._sizes)
+
+    def record(self, expense: Expense):
+        """Apply an added or edited expense to its group, moving it out of its previous group if needed"""
+        previous = self._group_of.get(expense.id)
+        if previous is not None and previous != expense.group_id:
+            self.discard(expense.id)
+        partition = self._partitions.get(expense.group_id)
+        if partition is None:
+            partition = self._partitions[expense.group_id] = self._factory()
+        if expense.id not in self._group_of:
+            self._group_of[expense.id] = expense.group_id
+            self._sizes[expense.group_id] = self._sizes.get(expense.group_id, 0) + 1
+        partition.record(expense)
+
+    def discard(self, expense_id: str):
+        group_id = self._group_of.pop(expense_id, None)
+        if group_id is None:
+            return
+        self._partitions[group_id].discard(expense_id)
+        self._sizes[group_id] -= 1
+        if not self._sizes[group_id]:
+            del self._sizes[group_id]
+            del self._partitions[group_id]
+
+    def rebuild(self, expenses: Iterable[Expense]):
+        self._partitions = {}
+        self._group_of = {}
+        self._sizes = {}
+        for expense in expenses:
+            self.record(expense)
+
+    def state(self) -> tuple:
+        return self._group_of, {group_id: partition.state() for group_id, partition in self._partitions.items()}
+
+    def restore(self, state: tuple):
+        self._group_of, partitions = state
+        self._partitions = {}
+        for group_id, partition_state in partitions.items():
+            partition = self._partitions[group_id] = self._factory()
+            partition.restore(partition_state)
+        self._sizes = {}
+        for group_id in self._group_of.values():
+            self._sizes[group_id] = self._sizes.get(group_id, 0) + 1
+
+
+class GroupLedgers(Partitioned):
+    """A BalanceLedger per group, plus the groups each user has a non-zero balance in"""
+
+    def __init__(self):
+        super().__init__(BalanceLedger)
+        self._memberships: Dict[str, Set[str]] = {}
+
+    def _refresh(self, group_id: str, users: Iterable[str]):
+        ledger = self._partitions.get(group_id)
+        for user in users:
+            if ledger is not None and ledger.balance_cents(user):
+                self._memberships.setdefault(user, set()).add(group_id)
+            else:
+                groups = self._memberships.get(user)
+                if groups is not None:
+                    groups.discard(group_id)
+                    if not groups:
+                        del self._memberships[user]
+
+    def record(self, expense: Expense):
+        # Moving to another group goes through discard(), which refreshes the old group
+        same_group = self._group_of.get(expense.id) == expense.group_id
+        before = self.users(expense.id) if same_group else set()
+        super().record(expense)
+        self._refresh(expense.group_id, before | self.users(expense.id))
+
+    def discard(self, expense_id: str):
+        group_id = self._group_of.get(expense_id)
+        if group_id is None:
+            return
+        users = self.users(expense_id)
+        super().discard(expense_id)
+        self._refresh(group_id, users)
+
+    def rebuild(self, expenses: Iterable[Expense]):
+        self._memberships = {}
+        super().rebuild(expenses)
+
+    def restore(self, state: tuple):
+        super().restore(state)
+        self._memberships = {}
+        for group_id, ledger in self._partitions.items():
+            for user in ledger.balances_cents():
+                self._memberships.setdefault(user, set()).add(group_id)
+
+    def users(self, expense_id: str) -> set:
+        """Users whose balance the expense currently contributes to, in its group"""
+        group_id = self._group_of.get(expense_id)
+        return self._partitions[group_id].users(expense_id) if group_id is not None else set()
+
+    def group_balances(self, user_name: str) -> Dict[str, float]:
+        """{group id: the user's net balance there} for every group where it is not zero"""
+        return {
+            group_id: self._partitions[group_id].balance(user_name)
+            for group_id in self._memberships.get(user_name, ())
+        }
+
+    def total(self, user_name: str) -> float:
+        """The user's net balance summed over every group"""
+        return from_cents(sum(
+            self._partitions[group_id].balance_cents(user_name)
+            for group_id in self._memberships.get(user_name, ())
+        ))
+
+    def balances_cents(self) -> Dict[str, int]:
+        """Every user's net balance summed over all groups, in cents"""
+        totals = {}
+        for user, groups in self._memberships.items():
+            cents = sum(self._partitions[group_id].balance_cents(user) for group_id in groups)
+            if cents:
+                totals[user] = cents
+        return totals
+
+    def balances(self) -> Dict[str, float]:
+        return {user: from_cents(cents) for user, cents in self.balances_cents().items()}
+
+    def verify(self, expenses: Iterable[Expense]) -> Dict[Tuple[str, str], int]:
+        """Compare each group's ledger with a full recompute; returns {(group, user): drift in cents}"""
+        by_group: Dict[str, List[Expense]] = {}
+        for expense in expenses:
+            by_group.setdefault(expense.group_id, []).append(expense)
+        mismatches = {}
+        for group_id in set(by_group) | set(self._partitions):
+            for user, drift in self.get(group_id).verify(by_group.get(group_id, [])).items():
+                mismatches[(group_id, user)] = drift
+        return mismatches
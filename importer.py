@@ -0,0 +1,281 @@
+"""Bulk import of historical expenses from CSV or JSONL.
+
+Rows stream through a generator pipeline (parse -> normalise -> compute splits ->
+validate -> commit) in fixed-size batches, so memory stays flat however large the
+file is. Rows are handled as plain tuples until a batch has been validated; only
+rows that pass become Expense objects for the commit.
+
+CSV columns: title, amount, paid_by, participants, split_type, payment_type, date,
+category, payments, splits. Names are comma-separated like the add expense form, and
+payments/splits (only needed for the unequal types) are "Name:amount" pairs, e.g.
+"Veer:60,Ann:40". JSONL rows use the same keys; lists and objects are accepted too.
+
+Usage: python importer.py expenses.csv [--database splitwise.db] [--batch-size 1000] [--group trip]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import uuid
+from collections import namedtuple
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from models import DEFAULT_GROUP, Expense, Participant, PaymentType, SplitType
+from money import adds_up, from_cents, parse_amount, split_evenly, to_cents, total_cents
+
+DEFAULT_BATCH_SIZE = 1000
+# Only the first errors are kept so a badly broken file cannot exhaust memory
+MAX_REPORTED_ERRORS = 1000
+
+ImportRow = namedtuple('ImportRow', [
+    'line', 'title', 'amount', 'payers', 'participants', 'split_type', 'payment_type',
+    'date', 'category', 'payments', 'splits',
+])
+RowError = namedtuple('RowError', ['line', 'message'])
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failed: int = 0
+    errors: List[RowError] = field(default_factory=list)
+
+    def add_error(self, error: RowError):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+    def to_dict(self) -> dict:
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': [{'line': e.line, 'message': e.message} for e in self.errors],
+        }
+
+
+def read_rows(stream: Iterable[str], file_format: str) -> Iterator[tuple]:
+    """Yield (line number, raw row dict) from a CSV or JSONL text stream"""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif file_format == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, RowError(line_number, f"Invalid JSON: {e.msg}")
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def _normalise_names(value) -> List[str]:
+    if isinstance(value, str):
+        value = value.split(',')
+    names = []
+    for name in value or []:
+        name = ' '.join(str(name).split())
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _parse_amounts(value) -> Dict[str, float]:
+    if isinstance(value, dict):
+        return {' '.join(name.split()): parse_amount(amount) for name, amount in value.items()}
+    if isinstance(value, str):
+        value = value.split(',')
+    elif not isinstance(value, (list, type(None))):
+        raise ValueError(f"expected Name:amount pairs, got {json.dumps(value)}")
+    amounts = {}
+    for pair in value or []:
+        if not isinstance(pair, str):
+            raise ValueError(f"expected Name:amount, got {json.dumps(pair)}")
+        if not pair.strip():
+            continue
+        name, separator, amount = pair.rpartition(':')
+        if not separator:
+            raise ValueError(f"expected Name:amount, got '{pair.strip()}'")
+        amounts[' '.join(name.split())] = parse_amount(amount)
+    return amounts
+
+
+def normalise(rows: Iterable[tuple]) -> Iterator:
+    """Turn raw rows into ImportRows, or RowErrors for rows that cannot be parsed"""
+    for line, raw in rows:
+        if isinstance(raw, RowError):
+            yield raw
+            continue
+        if not isinstance(raw, dict):
+            yield RowError(line, "Expected a JSON object")
+            continue
+        try:
+            payers = _normalise_names(raw.get('paid_by'))
+            participants = _normalise_names(raw.get('participants'))
+            # Payers are included in the participants, as in the add expense form
+            participants += [payer for payer in payers if payer not in participants]
+            date = raw.get('date')
+            yield ImportRow(
+                line=line,
+                title=str(raw.get('title') or '').strip(),
+                amount=parse_amount(raw['amount']),
+                payers=payers,
+                participants=participants,
+                split_type=SplitType(raw.get('split_type') or SplitType.EQUAL.value),
+                payment_type=PaymentType(raw.get('payment_type') or PaymentType.EQUAL.value),
+                date=datetime.fromisoformat(date) if date else datetime.now(),
+                category=str(raw.get('category') or '').strip() or None,
+                payments=_parse_amounts(raw.get('payments')),
+                splits=_parse_amounts(raw.get('splits')),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            message = f"Missing column {e}" if isinstance(e, KeyError) else f"Invalid input - {e}"
+            yield RowError(line, message)
+
+
+def compute_splits(rows: Iterable) -> Iterator:
+    """Fill in equal payments and splits the same way Expense.calculate_splits does.
+
+    Only payers' payments and participants' splits are kept, as the add expense form only
+    reads the amounts of the people it lists, so what is validated is exactly what is stored.
+    """
+    for row in rows:
+        if isinstance(row, RowError):
+            yield row
+            continue
+        if not row.title:
+            yield RowError(row.line, "Title is required")
+            continue
+        if not row.payers:
+            yield RowError(row.line, "At least one payer must be specified")
+            continue
+        if not row.participants:
+            yield RowError(row.line, "At least one participant must be specified")
+            continue
+
+        total = to_cents(row.amount)
+        if row.payment_type == PaymentType.EQUAL:
+            payments = {payer: from_cents(share) for payer, share in zip(row.payers, split_evenly(total, len(row.payers)))}
+        else:
+            payments = {payer: row.payments.get(payer, 0.0) for payer in row.payers}
+        if row.split_type == SplitType.EQUAL:
+            splits = {name: from_cents(share) for name, share in zip(row.participants, split_evenly(total, len(row.participants)))}
+        else:
+            splits = {name: row.splits.get(name, 0.0) for name in row.participants}
+        yield row._replace(payments=payments, splits=splits)
+
+
+def batches(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def validate_batch(batch: list) -> tuple:
+    """Check each row's payment and split totals with money.adds_up, the rule behind
+    Expense.validate_payments and Expense.validate_unequal_splits. Returns (valid rows, errors)
+    """
+    valid, errors = [], []
+    for row in batch:
+        if isinstance(row, RowError):
+            errors.append(row)
+            continue
+        if not adds_up(row.payments.values(), row.amount):
+            paid = from_cents(total_cents(row.payments.values()))
+            errors.append(RowError(row.line, f"Total payments (${paid:.2f}) don't match expense amount (${row.amount:.2f})"))
+        elif not adds_up(row.splits.values(), row.amount):
+            owed = from_cents(total_cents(row.splits.values()))
+            errors.append(RowError(row.line, f"Total split amounts (${owed:.2f}) don't match expense amount (${row.amount:.2f})"))
+        else:
+            valid.append(row)
+    return valid, errors
+
+
+def build_expense(row: ImportRow, group_id: str = DEFAULT_GROUP) -> Expense:
+    participants = [Participant(name=name, amount_owed=row.splits.get(name, 0.0)) for name in row.participants]
+    expense = Expense(
+        id=str(uuid.uuid4()),
+        title=row.title,
+        amount=row.amount,
+        paid_by=', '.join(row.payers),
+        participants=participants,
+        split_type=row.split_type,
+        payment_type=row.payment_type,
+        date=row.date,
+        category=row.category,
+        group_id=group_id,
+    )
+    expense.set_payments(row.payments)
+    return expense
+
+
+def parse_expenses(items: list, group_id: str = DEFAULT_GROUP) -> Tuple[List[Expense], List[RowError]]:
+    """Expenses from JSON objects laid out like JSONL import rows, validated as an import batch.
+
+    Used by the JSON write API; each error's line is the position of its item in the list.
+    """
+    valid, errors = validate_batch(list(compute_splits(normalise(enumerate(items)))))
+    return [build_expense(row, group_id) for row in valid], errors
+
+
+def import_expenses(stream: Iterable[str], file_format: str, repository,
+                    batch_size: int = DEFAULT_BATCH_SIZE,
+                    on_commit: Optional[Callable[[List[Expense]], None]] = None,
+                    on_error: Optional[Callable[[RowError], None]] = None,
+                    group_id: str = DEFAULT_GROUP) -> ImportReport:
+    """Stream rows from a CSV/JSONL text stream into the repository (filed under group_id), one batch per transaction"""
+    report = ImportReport()
+    pipeline = compute_splits(normalise(read_rows(stream, file_format)))
+    for batch in batches(pipeline, batch_size):
+        valid, errors = validate_batch(batch)
+        for error in errors:
+            report.add_error(error)
+            if on_error:
+                on_error(error)
+        if not valid:
+            continue
+        expenses = [build_expense(row, group_id) for row in valid]
+        repository.add_many(expenses)
+        report.imported += len(expenses)
+        if on_commit:
+            on_commit(expenses)
+    return report
+
+
+def detect_format(filename: str) -> str:
+    return 'jsonl' if filename.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def main(argv=None):
+    from storage import create_repository
+
+    parser = argparse.ArgumentParser(description="Bulk import expenses from a CSV or JSONL file")
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'jsonl'])
+    parser.add_argument('--database', default=os.environ.get('SPLITWISE_DATABASE', 'splitwise.db'))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--group', default=DEFAULT_GROUP, help='Group to file the expenses under')
+    args = parser.parse_args(argv)
+
+    repository = create_repository(args.database)
+    with io.open(args.path, newline='', encoding='utf-8') as stream:
+        report = import_expenses(
+            stream, args.format or detect_format(args.path), repository, batch_size=args.batch_size, group_id=args.group,
+            on_error=lambda error: print(f"line {error.line}: {error.message}", file=sys.stderr),
+        )
+    print(f"Imported {report.imported} expenses, {report.failed} rows failed")
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+from typing import Dict, Iterable, Tuple
+
+from models import Expense
+from money import from_cents
+
+
+class BalanceLedger:
+    """Running per-user net balances, updated as expenses are added, edited or deleted"""
+
+    def __init__(self):
+        # Everything is kept in integer cents so repeated updates never drift.
+        # Positive balance = user is owed money, negative = user owes money
+        self._balances: Dict[str, int] = {}
+        # The balance summary each expense contributed when it was last recorded,
+        # so an edit or delete can back out exactly what was applied
+        self._contributions: Dict[str, Dict[str, int]] = {}
+        # Sparse pairwise debts: _debts[a][b] is what b owes a (negative if a owes b).
+        # Both directions are stored so reading one user's relationships only touches their row
+        self._debts: Dict[str, Dict[str, int]] = {}
+
+    def _adjust_debt(self, creditor: str, debtor: str, amount: int):
+        for row_user, other, delta in ((creditor, debtor, amount), (debtor, creditor, -amount)):
+            row = self._debts.setdefault(row_user, {})
+            value = row.get(other, 0) + delta
+            if value == 0:
+                row.pop(other, None)
+                if not row:
+                    del self._debts[row_user]
+            else:
+                row[other] = value
+
+    def _apply(self, summary: Dict[str, int], sign: int):
+        for name, amount in summary.items():
+            balance = self._balances.get(name, 0) + sign * amount
+            if balance == 0:
+                self._balances.pop(name, None)
+            else:
+                self._balances[name] = balance
+        for (creditor, debtor), amount in pairwise_debts(summary).items():
+            self._adjust_debt(creditor, debtor, sign * amount)
+
+    def record(self, expense: Expense):
+        """Apply an added or edited expense, replacing its previous contribution if any"""
+        self.discard(expense.id)
+        summary = expense.get_balance_summary_cents()
+        self._contributions[expense.id] = summary
+        self._apply(summary, 1)
+
+    def discard(self, expense_id: str):
+        """Back out the contribution of a deleted (or about to be re-recorded) expense"""
+        summary = self._contributions.pop(expense_id, None)
+        if summary is not None:
+            self._apply(summary, -1)
+
+    def rebuild(self, expenses: Iterable[Expense]):
+        self._balances = {}
+        self._contributions = {}
+        self._debts = {}
+        for expense in expenses:
+            self.record(expense)
+
+    def state(self) -> tuple:
+        return self._balances, self._contributions, self._debts
+
+    def restore(self, state: tuple):
+        self._balances, self._contributions, self._debts = state
+
+    def users(self, expense_id: str) -> set:
+        """Users whose balance the expense currently contributes to"""
+        return set(self._contributions.get(expense_id, ()))
+
+    def balance(self, user_name: str) -> float:
+        return from_cents(self._balances.get(user_name, 0))
+
+    def balance_cents(self, user_name: str) -> int:
+        return self._balances.get(user_name, 0)
+
+    def balances(self) -> Dict[str, float]:
+        return {name: from_cents(cents) for name, cents in self._balances.items()}
+
+    def balances_cents(self) -> Dict[str, int]:
+        return dict(self._balances)
+
+    def relationships(self, user_name: str) -> Dict[str, float]:
+        """What each other user owes this user (negative if this user owes them)"""
+        row = self._debts.get(user_name, {})
+        return {other: from_cents(cents) for other, cents in row.items()}
+
+    def verify(self, expenses: Iterable[Expense]) -> Dict[str, int]:
+        """Compare the ledger with a full recompute; returns {user: drift in cents} for users that disagree"""
+        expected = compute_net_balances_cents(expenses)
+        mismatches = {}
+        for name in set(expected) | set(self._balances):
+            drift = self._balances.get(name, 0) - expected.get(name, 0)
+            if drift:
+                mismatches[name] = drift
+        return mismatches
+
+
+def pairwise_debts(summary: Dict[str, int]) -> Dict[Tuple[str, str], int]:
+    """Split one expense's balance summary into {(creditor, debtor): amount} pairs.
+
+    Every overpaid user is matched against every underpaid user for the smaller
+    of the two amounts, which is how per-user relationships have always been shown.
+    """
+    creditors = [(name, amount) for name, amount in summary.items() if amount > 0]
+    debtors = [(name, -amount) for name, amount in summary.items() if amount < 0]
+    debts = {}
+    for creditor, owed in creditors:
+        for debtor, owes in debtors:
+            debts[(creditor, debtor)] = min(owed, owes)
+    return debts
+
+
+def compute_net_balances_cents(expenses: Iterable[Expense]) -> Dict[str, int]:
+    """Full recompute of every user's net balance, in cents, by scanning all expenses"""
+    balances = {}
+    for expense in expenses:
+        for name, cents in expense.get_balance_summary_cents().items():
+            balances[name] = balances.get(name, 0) + cents
+    return balances
+
+
+def compute_relationships(expenses: Iterable[Expense], user_name: str) -> Dict[str, float]:
+    """Full recompute of a user's pairwise balances, one pass over every expense per other user"""
+    expenses = list(expenses)
+    relationships = {}
+
+    # Get all unique users across all expenses
+    all_users = set()
+    for expense in expenses:
+        for participant in expense.participants:
+            all_users.add(participant.name)
+        for payer in expense.external_payments.keys():
+            all_users.add(payer)
+
+    for other_user in all_users:
+        if other_user == user_name:
+            continue
+
+        net_between_users = 0.0
+        for expense in expenses:
+            balance_summary = expense.get_balance_summary()
+            user_balance = balance_summary.get(user_name, 0.0)
+            other_balance = balance_summary.get(other_user, 0.0)
+
+            if user_balance > 0 and other_balance < 0:
+                net_between_users += min(user_balance, -other_balance)
+            elif user_balance < 0 and other_balance > 0:
+                net_between_users -= min(-user_balance, other_balance)
+
+        if abs(net_between_users) >= 0.01:
+            relationships[other_user] = net_between_users
+
+    return relationships
@@ -0,0 +1,153 @@
+"""Request latency histograms, timing spans and an opt-in per-request profiler.
+
+Everything is kept in process memory and rendered in the Prometheus text format
+by render_metrics(). instrument(app) wires the Flask hooks.
+"""
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Sequence, Tuple
+
+from flask import Response, g, has_request_context, request, before_render_template, template_rendered
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 500, 1000, 10000, 100000)
+PROFILE_LINES = 40
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in the shape Prometheus expects"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), then sum and count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in sorted(self._series.items())]
+        for labels, counts, total, count in snapshot:
+            pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                bucket_labels = ",".join(pairs + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            label_text = f'{{{",".join(pairs)}}}' if pairs else ''
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_LATENCY = Histogram(
+    'splitwise_request_duration_seconds', 'Time spent handling a request.',
+    ('endpoint', 'method', 'status'), LATENCY_BUCKETS,
+)
+SPAN_LATENCY = Histogram(
+    'splitwise_span_duration_seconds', 'Time spent in instrumented code paths.',
+    ('span',), LATENCY_BUCKETS,
+)
+EXPENSES_SCANNED = Histogram(
+    'splitwise_expenses_scanned', 'Expenses loaded or examined while handling a request.',
+    ('endpoint',), COUNT_BUCKETS,
+)
+HISTOGRAMS = (REQUEST_LATENCY, SPAN_LATENCY, EXPENSES_SCANNED)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block of code into the span histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPAN_LATENCY.observe(time.perf_counter() - start, name)
+
+
+def timed(name: str):
+    """Decorator form of span()"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count_scanned(count: int):
+    """Add to the number of expenses the current request has had to look at"""
+    if has_request_context():
+        g.expenses_scanned = g.get('expenses_scanned', 0) + count
+
+
+def render_metrics() -> str:
+    return "\n".join(histogram.render() for histogram in HISTOGRAMS) + "\n"
+
+
+def instrument(app, allow_profiling: bool = False):
+    """Record request latency and scan counts for every request, and time template rendering.
+
+    With allow_profiling, any request with ?profile=1 is run under cProfile and answered
+    with the pstats summary instead of its normal response.
+    """
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        if allow_profiling and request.args.get('profile') == '1':
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_request(response):
+        status = str(response.status_code)
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            output = io.StringIO()
+            stats = pstats.Stats(profiler, stream=output)
+            stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+            response = Response(output.getvalue(), mimetype='text/plain')
+            response.headers['X-Profiled-Status'] = status
+
+        endpoint = request.endpoint or 'unmatched'
+        started = g.pop('request_started', None)
+        if started is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint, request.method, status)
+        EXPENSES_SCANNED.observe(g.pop('expenses_scanned', 0), endpoint)
+        return response
+
+    @before_render_template.connect_via(app)
+    def start_render(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    @template_rendered.connect_via(app)
+    def finish_render(sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None:
+            SPAN_LATENCY.observe(time.perf_counter() - started, f'render:{template.name}')
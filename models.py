@@ -2,6 +2,10 @@ from dataclasses import dataclass
 from typing import List, Dict, Optional
 from datetime import datetime
 from enum import Enum
+from money import adds_up, from_cents, split_evenly, to_cents
+
+# Group that expenses belong to unless they are filed under another one
+DEFAULT_GROUP = "default"
 
 class SplitType(Enum):
     EQUAL = "equal"
@@ -29,6 +33,8 @@ class Expense:
     category: Optional[str] = None
     external_payments: Dict[str, float] = None  # Payments from non-participants
     payment_type: PaymentType = PaymentType.EQUAL  # New field for payment type
+    version: int = 0  # Bumped by the repository on every save; 0 until first stored
+    group_id: str = DEFAULT_GROUP
     
     def __post_init__(self):
         if self.external_payments is None:
@@ -36,30 +42,34 @@ class Expense:
     
     def calculate_splits(self):
         if self.split_type == SplitType.EQUAL:
-            per_person = self.amount / len(self.participants)
-            for participant in self.participants:
-                participant.amount_owed = per_person
+            # Split in whole cents; leftover cents go to the first participants
+            shares = split_evenly(to_cents(self.amount), len(self.participants))
+            for participant, share in zip(self.participants, shares):
+                participant.amount_owed = from_cents(share)
         elif self.split_type == SplitType.UNEQUAL:
             # For unequal splits, amounts should already be set by the caller
             # This method just ensures consistency
             pass
         
-    def get_balance_summary(self) -> Dict[str, float]:
+    def get_balance_summary_cents(self) -> Dict[str, int]:
         balances = {}
         
         # Calculate net balance for each participant
         # Positive balance = person is owed money
         # Negative balance = person owes money
         for participant in self.participants:
-            net_balance = participant.amount_paid - participant.amount_owed
+            net_balance = to_cents(participant.amount_paid) - to_cents(participant.amount_owed)
             balances[participant.name] = net_balance
         
         # Include external payers (non-participants who paid)
         for payer_name, amount_paid in self.external_payments.items():
-            balances[payer_name] = balances.get(payer_name, 0.0) + amount_paid
+            balances[payer_name] = balances.get(payer_name, 0) + to_cents(amount_paid)
             
         return balances
     
+    def get_balance_summary(self) -> Dict[str, float]:
+        return {name: from_cents(cents) for name, cents in self.get_balance_summary_cents().items()}
+    
     def set_payments(self, payments: Dict[str, float]):
         """Set who paid what amounts. payments is a dict of {name: amount_paid}"""
         # Reset external payments
@@ -75,17 +85,52 @@ class Expense:
             if payer_name not in participant_names and amount_paid > 0:
                 self.external_payments[payer_name] = amount_paid
     
+    def to_dict(self) -> dict:
+        """JSON-friendly representation used by the API endpoints"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'amount': self.amount,
+            'paid_by': self.paid_by,
+            'participants': [
+                {'name': p.name, 'amount_owed': p.amount_owed, 'amount_paid': p.amount_paid}
+                for p in self.participants
+            ],
+            'split_type': self.split_type.value,
+            'payment_type': self.payment_type.value,
+            'date': self.date.isoformat(),
+            'category': self.category,
+            'external_payments': dict(self.external_payments),
+            'version': self.version,
+            'group_id': self.group_id,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Expense':
+        """Inverse of to_dict"""
+        return cls(
+            id=data['id'],
+            title=data['title'],
+            amount=data['amount'],
+            paid_by=data['paid_by'],
+            participants=[Participant(**p) for p in data['participants']],
+            split_type=SplitType(data['split_type']),
+            payment_type=PaymentType(data['payment_type']),
+            date=datetime.fromisoformat(data['date']),
+            category=data['category'],
+            external_payments=dict(data['external_payments']),
+            version=data.get('version', 0),
+            group_id=data.get('group_id', DEFAULT_GROUP),
+        )
+    
     def validate_payments(self) -> bool:
         """Check if total payments equal the expense amount"""
-        total_paid = sum(p.amount_paid for p in self.participants) + sum(self.external_payments.values())
-        return abs(total_paid - self.amount) < 0.01  # Allow for small rounding errors
+        return adds_up([p.amount_paid for p in self.participants] + list(self.external_payments.values()), self.amount)
     
     def validate_unequal_payments(self, payment_amounts: Dict[str, float]) -> bool:
         """Validate that unequal payment amounts sum to total expense amount"""
-        total_payments = sum(payment_amounts.values())
-        return abs(total_payments - self.amount) < 0.01
+        return adds_up(payment_amounts.values(), self.amount)
     
     def validate_unequal_splits(self, split_amounts: Dict[str, float]) -> bool:
         """Validate that unequal split amounts sum to total expense amount"""
-        total_splits = sum(split_amounts.values())
-        return abs(total_splits - self.amount) < 0.01
\ No newline at end of file
+        return adds_up(split_amounts.values(), self.amount)
\ No newline at end of file
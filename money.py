@@ -0,0 +1,61 @@
+"""Money helpers built on integer cents.
+
+Amounts are still exposed as floats on the models, but every split, total and
+balance is computed in whole cents so nothing drifts: a $100 three-way split is
+33.34 / 33.33 / 33.33 and balances always sum to exactly zero.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Iterable, List
+
+
+def parse_cents(text: str) -> int:
+    """Exact cents for user input such as "12.345" (rounded half up); raises ValueError.
+
+    Negative amounts are rejected: every expense, payment and split is an amount someone paid
+    or owes, and a refund is entered with payer and participants swapped, not as a negative.
+    """
+    try:
+        value = Decimal(str(text).strip())
+        if value.is_finite():
+            # quantize raises InvalidOperation too, for values too large to hold in whole cents
+            cents = int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+            if cents < 0:
+                raise ValueError(f"amount cannot be negative: '{text}'")
+            return cents
+    except InvalidOperation:
+        pass
+    raise ValueError(f"could not convert string to amount: '{text}'")
+
+
+def parse_amount(text: str) -> float:
+    """User input rounded to whole cents, as the float the models store"""
+    return from_cents(parse_cents(text))
+
+
+def to_cents(amount: float) -> int:
+    """Cents for an amount already held to two decimals (as the models store them)"""
+    return round(amount * 100)
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+def total_cents(amounts: Iterable[float]) -> int:
+    """Sum of amounts held to two decimals, in whole cents"""
+    return sum(to_cents(amount) for amount in amounts)
+
+
+def adds_up(amounts: Iterable[float], total: float) -> bool:
+    """Whether amounts sum to total to the cent; the rule behind every payment and split check"""
+    return total_cents(amounts) == to_cents(total)
+
+
+def split_evenly(total: int, count: int) -> List[int]:
+    """Equal shares of total cents; the first total % count shares get one cent more"""
+    if count <= 0:
+        raise ValueError("cannot split between zero people")
+    if total < 0:
+        return [-share for share in split_evenly(-total, count)]
+    share, extra = divmod(total, count)
+    return [share + 1] * extra + [share] * (count - extra)
@@ -0,0 +1,76 @@
+"""Byte-bounded LRU cache for rendered page fragments, keyed on the data versions they show."""
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+def approximate_size(value) -> int:
+    """Rough memory footprint of a cached value in bytes (containers one level deep)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class RenderCache:
+    """Thread-safe LRU cache of rendered fragments and computed summaries, bounded in bytes.
+
+    Keys are expected to include the version of whatever the value was built from, so
+    entries never need invalidating: a write bumps the version, and the stale entry is
+    simply never asked for again and ages out.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value, size: Optional[int] = None):
+        size = approximate_size(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def get_or_build(self, key: Hashable, build: Callable[[], object]):
+        """Cached value for key, building and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
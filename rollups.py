@@ -0,0 +1,149 @@
+"""Spending rollups by user, category and day, for reports that never rescan expenses.
+
+Each expense adds its participants' shares (amount owed) to day buckets. Buckets are kept
+per (user, category) and also with either or both left open, so "everyone", "every category"
+and "everyone in every category" are lookups rather than sums over series. A series answers
+range totals from prefix sums over its sorted days, so a query costs a couple of binary
+searches however many expenses went into it; month totals are read off the same prefix sums.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from models import Expense
+from money import from_cents, to_cents
+
+UNCATEGORIZED = "Uncategorized"
+PERIODS = ("day", "month")
+
+SeriesKey = Tuple[Optional[str], Optional[str]]  # (user, category); None means all of them
+
+
+class _Series:
+    """Cents per day (as date ordinals) with lazily rebuilt prefix sums"""
+
+    __slots__ = ('totals', '_days', '_prefix')
+
+    def __init__(self):
+        self.totals: Dict[int, int] = {}
+        self._days: Optional[List[int]] = None
+        self._prefix: List[int] = []
+
+    def add(self, day: int, cents: int):
+        value = self.totals.get(day, 0) + cents
+        if value:
+            self.totals[day] = value
+        else:
+            self.totals.pop(day, None)
+        self._days = None
+
+    def index(self) -> Tuple[List[int], List[int]]:
+        """Sorted days and prefix sums, where prefix[i] is the total of the first i days"""
+        if self._days is None:
+            days = sorted(self.totals)
+            prefix = [0] * (len(days) + 1)
+            running = 0
+            for position, day in enumerate(days, 1):
+                running += self.totals[day]
+                prefix[position] = running
+            self._days, self._prefix = days, prefix
+        return self._days, self._prefix
+
+    def total(self, start: int, end: int) -> int:
+        """Cents from day start through day end, inclusive"""
+        days, prefix = self.index()
+        return prefix[bisect_right(days, end)] - prefix[bisect_left(days, start)]
+
+
+def _month_bounds(day: date) -> Tuple[date, date]:
+    first = day.replace(day=1)
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first, date.fromordinal(following.toordinal() - 1)
+
+
+class SpendingRollups:
+    """Per-user, per-category daily spending totals, updated as expenses are added, edited or deleted"""
+
+    def __init__(self):
+        self._series: Dict[SeriesKey, _Series] = {}
+        # What each expense contributed when it was last recorded: (day, category, {user: cents})
+        self._contributions: Dict[str, Tuple[int, str, Dict[str, int]]] = {}
+
+    def _apply(self, contribution: Tuple[int, str, Dict[str, int]], sign: int):
+        day, category, shares = contribution
+        for user, cents in shares.items():
+            for key in ((user, category), (user, None)):
+                self._add(key, day, sign * cents)
+        total = sum(shares.values())
+        for key in ((None, category), (None, None)):
+            self._add(key, day, sign * total)
+
+    def _add(self, key: SeriesKey, day: int, cents: int):
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = _Series()
+        series.add(day, cents)
+        if not series.totals:
+            del self._series[key]
+
+    def record(self, expense: Expense):
+        """Apply an added or edited expense, replacing its previous contribution if any"""
+        self.discard(expense.id)
+        shares: Dict[str, int] = {}
+        for participant in expense.participants:
+            shares[participant.name] = shares.get(participant.name, 0) + to_cents(participant.amount_owed)
+        contribution = (expense.date.toordinal(), expense.category or UNCATEGORIZED, shares)
+        self._contributions[expense.id] = contribution
+        self._apply(contribution, 1)
+
+    def discard(self, expense_id: str):
+        contribution = self._contributions.pop(expense_id, None)
+        if contribution is not None:
+            self._apply(contribution, -1)
+
+    def rebuild(self, expenses):
+        self._series = {}
+        self._contributions = {}
+        for expense in expenses:
+            self.record(expense)
+
+    def state(self) -> tuple:
+        return {key: series.totals for key, series in self._series.items()}, self._contributions
+
+    def restore(self, state: tuple):
+        totals, self._contributions = state
+        self._series = {}
+        for key, days in totals.items():
+            series = self._series[key] = _Series()
+            series.totals = days
+
+    def total(self, start: date, end: date, user: Optional[str] = None, category: Optional[str] = None) -> float:
+        """What user (or everyone) spent in category (or in all of them) from start to end, inclusive"""
+        series = self._series.get((user, category))
+        return from_cents(series.total(start.toordinal(), end.toordinal())) if series else 0.0
+
+    def breakdown(self, start: date, end: date, period: str = "month",
+                  user: Optional[str] = None, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """(period label, amount) for each day or month in the range with any spending, oldest first"""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown report period: {period}")
+        series = self._series.get((user, category))
+        if series is None:
+            return []
+        days, _ = series.index()
+        low, high = bisect_left(days, start.toordinal()), bisect_right(days, end.toordinal())
+        if low >= high:
+            return []
+        if period == "day":
+            return [(date.fromordinal(day).isoformat(), from_cents(series.totals[day])) for day in days[low:high]]
+
+        results = []
+        # Only walk the months between the first and last day that actually has spending
+        month_start, month_end = _month_bounds(date.fromordinal(days[low]))
+        last = date.fromordinal(days[high - 1])
+        while month_start <= last:
+            cents = series.total(max(month_start, start).toordinal(), min(month_end, end).toordinal())
+            if cents:
+                results.append((month_start.strftime("%Y-%m"), from_cents(cents)))
+            month_start, month_end = _month_bounds(date.fromordinal(month_end.toordinal() + 1))
+        return results
@@ -0,0 +1,111 @@
+import heapq
+from typing import Dict, List, Tuple
+
+from money import from_cents, to_cents
+
+# Groups up to this size are settled with the exact solver; it is exponential in group size
+EXACT_SOLVER_LIMIT = 12
+
+Transfer = Tuple[str, str, float]  # (from debtor, to creditor, amount)
+
+
+def _to_cents(balances: Dict[str, float]) -> Dict[str, int]:
+    cents = {name: to_cents(amount) for name, amount in balances.items()}
+    return {name: amount for name, amount in cents.items() if amount != 0}
+
+
+def _greedy_cents(balances: Dict[str, int]) -> List[Tuple[str, str, int]]:
+    """Repeatedly match the largest creditor with the largest debtor"""
+    creditors = [(-amount, name) for name, amount in balances.items() if amount > 0]
+    debtors = [(amount, name) for name, amount in balances.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        owed, creditor = heapq.heappop(creditors)
+        owes, debtor = heapq.heappop(debtors)
+        amount = min(-owed, -owes)
+        transfers.append((debtor, creditor, amount))
+        if -owed > amount:
+            heapq.heappush(creditors, (owed + amount, creditor))
+        if -owes > amount:
+            heapq.heappush(debtors, (owes + amount, debtor))
+    return transfers
+
+
+def _zero_sum_groups(balances: Dict[str, int]) -> List[List[str]]:
+    """Partition users into the largest number of groups that each sum to zero.
+
+    A group of k users can always be settled with k - 1 transfers, so maximising the
+    number of groups minimises the total transfer count. dp[mask] is the most zero-sum
+    groups that the users in mask can be split into.
+    """
+    names = list(balances)
+    amounts = [balances[name] for name in names]
+    size = 1 << len(names)
+
+    totals = [0] * size
+    dp = [0] * size
+    for mask in range(1, size):
+        lowest = (mask & -mask).bit_length() - 1
+        totals[mask] = totals[mask & (mask - 1)] + amounts[lowest]
+        best = 0
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            best = max(best, dp[mask ^ bit])
+            bits ^= bit
+        dp[mask] = best + (1 if totals[mask] == 0 else 0)
+
+    # Walk back from the full set, one user at a time, cutting a group every time
+    # the remaining users sum to zero
+    groups = []
+    current = []
+    mask = size - 1
+    while mask:
+        gained = 1 if totals[mask] == 0 else 0
+        bits = mask
+        while bits:
+            bit = bits & -bits
+            if dp[mask ^ bit] + gained == dp[mask]:
+                break
+            bits ^= bit
+        current.append(names[bit.bit_length() - 1])
+        mask ^= bit
+        if totals[mask] == 0:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _exact_cents(balances: Dict[str, int]) -> List[Tuple[str, str, int]]:
+    transfers = []
+    for group in _zero_sum_groups(balances):
+        transfers.extend(_greedy_cents({name: balances[name] for name in group}))
+    return transfers
+
+
+def settle_up(balances: Dict[str, float], strategy: str = "auto") -> List[Transfer]:
+    """Transfers that bring every net balance to zero.
+
+    balances follows the Expense.get_balance_summary convention: positive means the
+    user is owed money, negative means they owe. strategy is "greedy", "exact", or
+    "auto" (exact for groups up to EXACT_SOLVER_LIMIT people, greedy above that).
+    """
+    cents = _to_cents(balances)
+
+    if strategy == "auto":
+        strategy = "exact" if len(cents) <= EXACT_SOLVER_LIMIT else "greedy"
+    if strategy == "exact":
+        if len(cents) > EXACT_SOLVER_LIMIT:
+            raise ValueError(f"Exact settlement supports at most {EXACT_SOLVER_LIMIT} people with a balance, got {len(cents)}")
+        transfers = _exact_cents(cents)
+    elif strategy == "greedy":
+        transfers = _greedy_cents(cents)
+    else:
+        raise ValueError(f"Unknown settlement strategy: {strategy}")
+
+    return [(debtor, creditor, from_cents(amount)) for debtor, creditor, amount in transfers]
@@ -0,0 +1,509 @@
+import base64
+import bisect
+import copy
+import json
+import sqlite3
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from models import DEFAULT_GROUP, Expense, Participant, SplitType, PaymentType
+from compact import CompactExpense
+from eventlog import ADD, EDIT, LOG_DIRECTORY_SUFFIX, LOG_SUPPORTED, Event, EventLog
+
+
+def encode_cursor(expense: Expense) -> str:
+    """Opaque page cursor pointing just past the given expense in newest-first order"""
+    raw = json.dumps([expense.date.isoformat(), expense.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Returns (iso date, expense id); raises ValueError for a malformed cursor"""
+    try:
+        date, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        datetime.fromisoformat(date)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    return date, expense_id
+
+
+class ConcurrentModificationError(Exception):
+    """The expense was saved by someone else after it was read"""
+
+
+class ExpenseRepository:
+    """Storage interface the routes use to read and write expenses.
+
+    get() returns a private copy, so a route can edit it freely and only the
+    changes passed back through update() are kept. Every write is atomic and
+    appends the expense id to a change feed, which each worker process reads
+    through changes_since() to keep its in-memory indexes current.
+    """
+
+    # Backends that keep an EventLog of every write expose it here
+    event_log: Optional[EventLog] = None
+
+    def get(self, expense_id: str) -> Optional[Expense]:
+        raise NotImplementedError
+
+    def list(self) -> List[Expense]:
+        """All expenses, oldest first"""
+        raise NotImplementedError
+
+    def page(self, cursor: Optional[str] = None, limit: int = 20,
+             group_id: Optional[str] = None) -> Tuple[List[Expense], Optional[str]]:
+        """Up to limit expenses of one group (or of every group), newest first, starting after cursor.
+
+        Returns the expenses and the cursor for the next page (None on the last page).
+        Paging is keyset-based on (date, id), so any page costs the same to fetch.
+        """
+        raise NotImplementedError
+
+    def add(self, expense: Expense):
+        """Store a new expense; sets expense.version to 1"""
+        raise NotImplementedError
+
+    def add_many(self, expenses: List[Expense], durable: bool = False):
+        """Add a batch of expenses; backends that can should do it in one transaction.
+
+        With durable, the batch is on disk by the time this returns, however many expenses it
+        holds; otherwise a file-backed store may leave the last writes to the OS.
+        """
+        for expense in expenses:
+            self.add(expense)
+
+    def update(self, expense: Expense):
+        """Save an edited expense if it is still at expense.version, then bump the version.
+
+        Raises KeyError if the expense no longer exists and ConcurrentModificationError
+        if it was saved by someone else since it was read.
+        """
+        raise NotImplementedError
+
+    def delete(self, expense_id: str) -> bool:
+        """Remove an expense; returns False if it did not exist"""
+        raise NotImplementedError
+
+    def last_change(self) -> int:
+        """Sequence number of the newest change feed entry (0 if there are none)"""
+        raise NotImplementedError
+
+    def changes_since(self, sequence: int) -> List[Tuple[int, str]]:
+        """(sequence, expense id) for every write after sequence, oldest first"""
+        raise NotImplementedError
+
+
+class InMemoryExpenseRepository(ExpenseRepository):
+    """Dict-backed repository for tests and throwaway runs; nothing survives a restart.
+
+    With compact=True expenses are held as CompactExpense, which takes a fraction
+    of the memory when a process holds millions of them.
+    """
+
+    def __init__(self, compact: bool = False):
+        self._compact = compact
+        self._expenses: Dict[str, Expense] = {}
+        # (iso date, id) keys kept sorted for paging, per group and under None for all groups
+        self._orders: Dict[Optional[str], List[Tuple[str, str]]] = {None: []}
+        # Change feed: the id of the expense touched by each write, in order
+        self._changes: List[str] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(expense):
+        return (expense.date.isoformat(), expense.id)
+
+    def _index(self, expense):
+        for group_id in (None, expense.group_id):
+            bisect.insort(self._orders.setdefault(group_id, []), self._key(expense))
+
+    def _unindex(self, expense):
+        for group_id in (None, expense.group_id):
+            order = self._orders[group_id]
+            del order[bisect.bisect_left(order, self._key(expense))]
+            if not order and group_id is not None:
+                del self._orders[group_id]
+
+    def _store(self, expense):
+        return CompactExpense.from_expense(expense) if self._compact else copy.deepcopy(expense)
+
+    def _load(self, stored):
+        return stored.to_expense() if self._compact else copy.deepcopy(stored)
+
+    def get(self, expense_id):
+        with self._lock:
+            expense = self._expenses.get(expense_id)
+            return self._load(expense) if expense else None
+
+    def list(self):
+        with self._lock:
+            expenses = [self._load(e) for e in self._expenses.values()]
+        return sorted(expenses, key=self._key)
+
+    def page(self, cursor=None, limit=20, group_id=None):
+        with self._lock:
+            order = self._orders.get(group_id, [])
+            end = bisect.bisect_left(order, decode_cursor(cursor)) if cursor else len(order)
+            keys = order[max(0, end - limit):end]
+            expenses = [self._load(self._expenses[expense_id]) for _, expense_id in reversed(keys)]
+            has_more = end - limit > 0
+        return expenses, encode_cursor(expenses[-1]) if has_more and expenses else None
+
+    def add(self, expense):
+        with self._lock:
+            expense.version = 1
+            self._expenses[expense.id] = self._store(expense)
+            self._index(expense)
+            self._changes.append(expense.id)
+
+    def update(self, expense):
+        with self._lock:
+            previous = self._expenses.get(expense.id)
+            if previous is None:
+                raise KeyError(expense.id)
+            if previous.version != expense.version:
+                raise ConcurrentModificationError(expense.id)
+            expense.version += 1
+            self._unindex(previous)
+            self._expenses[expense.id] = self._store(expense)
+            self._index(expense)
+            self._changes.append(expense.id)
+
+    def delete(self, expense_id):
+        with self._lock:
+            expense = self._expenses.pop(expense_id, None)
+            if expense is None:
+                return False
+            self._unindex(expense)
+            self._changes.append(expense_id)
+            return True
+
+    def last_change(self):
+        with self._lock:
+            return len(self._changes)
+
+    def changes_since(self, sequence):
+        with self._lock:
+            return list(enumerate(self._changes[sequence:], sequence + 1))
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS expenses (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    amount REAL NOT NULL,
+    paid_by TEXT NOT NULL,
+    split_type TEXT NOT NULL,
+    payment_type TEXT NOT NULL,
+    date TEXT NOT NULL,
+    category TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    group_id TEXT NOT NULL DEFAULT '{DEFAULT_GROUP}'
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date, id);
+
+CREATE TABLE IF NOT EXISTS participants (
+    expense_id TEXT NOT NULL REFERENCES expenses (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    amount_owed REAL NOT NULL,
+    amount_paid REAL NOT NULL,
+    PRIMARY KEY (expense_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_participants_name ON participants (name);
+
+CREATE TABLE IF NOT EXISTS external_payments (
+    expense_id TEXT NOT NULL REFERENCES expenses (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (expense_id, name)
+);
+
+-- Change feed: one row per write, so every worker process can tell what to reload.
+-- Writers hold SQLite's write lock from insert to commit, so sequence numbers become
+-- visible in order and a reader never skips an entry that commits later.
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    expense_id TEXT NOT NULL
+);
+"""
+
+# Created after the migrations below, since older databases lack the column until then
+CREATE_GROUP_INDEX = "CREATE INDEX IF NOT EXISTS idx_expenses_group_date ON expenses (group_id, date, id)"
+
+# Seconds a writer waits for another process to release the database before giving up
+BUSY_TIMEOUT = 30
+
+# Statements are kept as constants so sqlite3's statement cache prepares each one once
+SELECT_EXPENSE = "SELECT id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id FROM expenses WHERE id = ?"
+SELECT_EXPENSES = "SELECT id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id FROM expenses ORDER BY date, id"
+SELECT_FIRST_PAGE = "SELECT id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id FROM expenses ORDER BY date DESC, id DESC LIMIT ?"
+SELECT_PAGE = "SELECT id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id FROM expenses WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT ?"
+SELECT_GROUP_FIRST_PAGE = "SELECT id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id FROM expenses WHERE group_id = ? ORDER BY date DESC, id DESC LIMIT ?"
+SELECT_GROUP_PAGE = "SELECT id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id FROM expenses WHERE group_id = ? AND (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT ?"
+# The IN (...) placeholders are filled in per call by _load_rows
+SELECT_PARTICIPANTS_IN = "SELECT expense_id, name, amount_owed, amount_paid FROM participants WHERE expense_id IN ({}) ORDER BY expense_id, position"
+SELECT_ALL_PARTICIPANTS = "SELECT expense_id, name, amount_owed, amount_paid FROM participants ORDER BY expense_id, position"
+SELECT_EXTERNAL_PAYMENTS_IN = "SELECT expense_id, name, amount FROM external_payments WHERE expense_id IN ({})"
+SELECT_ALL_EXTERNAL_PAYMENTS = "SELECT expense_id, name, amount FROM external_payments"
+INSERT_EXPENSE = "INSERT INTO expenses (id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)"
+UPDATE_EXPENSE = "UPDATE expenses SET title = ?, amount = ?, paid_by = ?, split_type = ?, payment_type = ?, date = ?, category = ?, group_id = ?, version = version + 1 WHERE id = ? AND version = ?"
+EXPENSE_EXISTS = "SELECT 1 FROM expenses WHERE id = ?"
+DELETE_EXPENSE = "DELETE FROM expenses WHERE id = ?"
+INSERT_PARTICIPANT = "INSERT INTO participants (expense_id, position, name, amount_owed, amount_paid) VALUES (?, ?, ?, ?, ?)"
+DELETE_PARTICIPANTS = "DELETE FROM participants WHERE expense_id = ?"
+INSERT_EXTERNAL_PAYMENT = "INSERT INTO external_payments (expense_id, name, amount) VALUES (?, ?, ?)"
+DELETE_EXTERNAL_PAYMENTS = "DELETE FROM external_payments WHERE expense_id = ?"
+INSERT_CHANGE = "INSERT INTO changes (expense_id) VALUES (?)"
+SELECT_LAST_CHANGE = "SELECT COALESCE(MAX(seq), 0) FROM changes"
+SELECT_LAST_INSERT = "SELECT last_insert_rowid()"
+SELECT_CHANGES = "SELECT seq, expense_id FROM changes WHERE seq > ? ORDER BY seq"
+SELECT_CHANGES_BETWEEN = "SELECT seq, expense_id FROM changes WHERE seq > ? AND seq < ? ORDER BY seq"
+
+
+class SQLiteExpenseRepository(ExpenseRepository):
+    """Expenses persisted in a local SQLite file (WAL mode), indexed by id, participant name and date"""
+
+    def __init__(self, path: str = "splitwise.db", event_log: Optional[EventLog] = None):
+        self.event_log = event_log
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode = WAL")
+            # Commits are atomic but not flushed to disk; add_many(durable=True) flushes its batch
+            self._connection.execute("PRAGMA synchronous = NORMAL")
+            self._connection.execute("PRAGMA foreign_keys = ON")
+            self._connection.executescript(SCHEMA)
+            columns = {row[1] for row in self._connection.execute("PRAGMA table_info(expenses)")}
+            if "version" not in columns:
+                # Databases created before expenses were versioned
+                with self._connection:
+                    self._connection.execute("ALTER TABLE expenses ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            if "group_id" not in columns:
+                # Databases created before groups; everything already there joins the default group
+                with self._connection:
+                    self._connection.execute(f"ALTER TABLE expenses ADD COLUMN group_id TEXT NOT NULL DEFAULT '{DEFAULT_GROUP}'")
+            self._connection.execute(CREATE_GROUP_INDEX)
+        if event_log is not None:
+            self._recover_event_log()
+
+    def close(self):
+        self._connection.close()
+        if self.event_log is not None:
+            self.event_log.close()
+
+    def _recover_event_log(self):
+        """Make the log cover every committed change.
+
+        A new log over an existing database starts with an add event for every expense; a
+        writer that crashed between commit and append leaves a gap at the end of the log,
+        filled here (and by _log_events, if another write comes first).
+        """
+        with self._lock, self.event_log.locked():
+            self.event_log.catch_up()
+            if self.event_log.is_empty():
+                last_change = self._connection.execute(SELECT_LAST_CHANGE).fetchone()[0]
+                self.event_log.append(Event.for_expense(last_change, ADD, expense) for expense in self._list())
+            else:
+                self.event_log.append(self._missing_events(self.event_log.last_sequence))
+
+    def _logging(self):
+        """Held around a write and the append of its events, so the log is in commit order"""
+        return self.event_log.locked() if self.event_log is not None else nullcontext()
+
+    def _missing_events(self, after: int, before: Optional[int] = None) -> List[Event]:
+        """Events for changes committed but never logged, built from the expenses' current state"""
+        if before is None:
+            changes = self._connection.execute(SELECT_CHANGES, (after,)).fetchall()
+        else:
+            changes = self._connection.execute(SELECT_CHANGES_BETWEEN, (after, before)).fetchall()
+        events = []
+        for sequence, expense_id in changes:
+            expense = self._get(expense_id)
+            events.append(Event.for_delete(sequence, expense_id) if expense is None
+                          else Event.for_expense(sequence, EDIT, expense))
+        return events
+
+    def _log_events(self, events: List[Event], sync: bool = False):
+        """Append a write's events, fsyncing the log if sync; with _lock and the log lock held.
+
+        If a writer crashed between its commit and its append, the log is missing those changes
+        by the time the next write is logged, so they are filled in first; otherwise the gap
+        would stay in the log for good and indexes restored from it would never see them.
+        """
+        self.event_log.catch_up()
+        if events and events[0].sequence > self.event_log.last_sequence + 1:
+            self.event_log.append(self._missing_events(self.event_log.last_sequence, events[0].sequence))
+        self.event_log.append(events, sync)
+
+    @staticmethod
+    def _build_expense(row, participants, external_payments) -> Expense:
+        expense_id, title, amount, paid_by, split_type, payment_type, date, category, version, group_id = row
+        return Expense(
+            id=expense_id,
+            title=title,
+            amount=amount,
+            paid_by=paid_by,
+            participants=[Participant(name=name, amount_owed=owed, amount_paid=paid) for name, owed, paid in participants],
+            split_type=SplitType(split_type),
+            payment_type=PaymentType(payment_type),
+            date=datetime.fromisoformat(date),
+            category=category,
+            external_payments=dict(external_payments),
+            version=version,
+            group_id=group_id,
+        )
+
+    def _write(self, expenses: List[Expense], insert_expenses: bool = True):
+        if insert_expenses:
+            self._connection.executemany(INSERT_EXPENSE, [
+                (e.id, e.title, e.amount, e.paid_by, e.split_type.value, e.payment_type.value, e.date.isoformat(), e.category, e.group_id)
+                for e in expenses
+            ])
+        self._connection.executemany(INSERT_PARTICIPANT, [
+            (e.id, position, p.name, p.amount_owed, p.amount_paid)
+            for e in expenses for position, p in enumerate(e.participants)
+        ])
+        self._connection.executemany(INSERT_EXTERNAL_PAYMENT, [
+            (e.id, name, amount) for e in expenses for name, amount in e.external_payments.items()
+        ])
+
+    @classmethod
+    def _build_expenses(cls, rows, participant_rows, external_rows) -> List[Expense]:
+        """Expenses from their rows plus (expense_id, ...) participant and external payment rows"""
+        participants = {}
+        for expense_id, name, owed, paid in participant_rows:
+            participants.setdefault(expense_id, []).append((name, owed, paid))
+        external_payments = {}
+        for expense_id, name, amount in external_rows:
+            external_payments.setdefault(expense_id, []).append((name, amount))
+        return [
+            cls._build_expense(row, participants.get(row[0], []), external_payments.get(row[0], []))
+            for row in rows
+        ]
+
+    def _load_rows(self, rows) -> List[Expense]:
+        """Expenses for rows with their participants and external payments, in two queries however many rows"""
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        placeholders = ", ".join("?" * len(ids))
+        participant_rows = self._connection.execute(SELECT_PARTICIPANTS_IN.format(placeholders), ids).fetchall()
+        external_rows = self._connection.execute(SELECT_EXTERNAL_PAYMENTS_IN.format(placeholders), ids).fetchall()
+        return self._build_expenses(rows, participant_rows, external_rows)
+
+    def _get(self, expense_id) -> Optional[Expense]:
+        row = self._connection.execute(SELECT_EXPENSE, (expense_id,)).fetchone()
+        return self._load_rows([row])[0] if row else None
+
+    def get(self, expense_id):
+        with self._lock:
+            return self._get(expense_id)
+
+    def page(self, cursor=None, limit=20, group_id=None):
+        # Fetch one extra row to learn whether another page follows
+        with self._lock:
+            if group_id is not None and cursor:
+                rows = self._connection.execute(SELECT_GROUP_PAGE, (group_id, *decode_cursor(cursor), limit + 1)).fetchall()
+            elif group_id is not None:
+                rows = self._connection.execute(SELECT_GROUP_FIRST_PAGE, (group_id, limit + 1)).fetchall()
+            elif cursor:
+                rows = self._connection.execute(SELECT_PAGE, (*decode_cursor(cursor), limit + 1)).fetchall()
+            else:
+                rows = self._connection.execute(SELECT_FIRST_PAGE, (limit + 1,)).fetchall()
+            expenses = self._load_rows(rows[:limit])
+        return expenses, encode_cursor(expenses[-1]) if len(rows) > limit else None
+
+    def _list(self) -> List[Expense]:
+        rows = self._connection.execute(SELECT_EXPENSES).fetchall()
+        participant_rows = self._connection.execute(SELECT_ALL_PARTICIPANTS).fetchall()
+        external_rows = self._connection.execute(SELECT_ALL_EXTERNAL_PAYMENTS).fetchall()
+        return self._build_expenses(rows, participant_rows, external_rows)
+
+    def list(self):
+        with self._lock:
+            return self._list()
+
+    def add(self, expense):
+        self.add_many([expense])
+
+    def add_many(self, expenses, durable=False):
+        with self._lock, self._logging():
+            if durable:
+                # In WAL mode FULL syncs the log on commit: one fsync for the whole batch
+                self._connection.execute("PRAGMA synchronous = FULL")
+            try:
+                with self._connection:
+                    self._write(expenses)
+                    self._connection.executemany(INSERT_CHANGE, [(e.id,) for e in expenses])
+                    # The batch's change rows are numbered consecutively up to the last insert
+                    first = self._connection.execute(SELECT_LAST_INSERT).fetchone()[0] - len(expenses) + 1
+            finally:
+                if durable:
+                    self._connection.execute("PRAGMA synchronous = NORMAL")
+            for expense in expenses:
+                expense.version = 1
+            if self.event_log is not None:
+                self._log_events([Event.for_expense(first + position, ADD, expense) for position, expense in enumerate(expenses)],
+                                 sync=durable)
+
+    def update(self, expense):
+        with self._lock, self._logging():
+            with self._connection:
+                sequence = self._update(expense)
+            expense.version += 1
+            if self.event_log is not None:
+                self._log_events([Event.for_expense(sequence, EDIT, expense)])
+
+    def _update(self, expense) -> int:
+        """Version-checked update inside the open transaction; returns the change feed number"""
+        # The version check and the write are one statement, so two workers saving the
+        # same expense cannot both succeed; the loser changes no rows
+        cursor = self._connection.execute(UPDATE_EXPENSE, (
+            expense.title, expense.amount, expense.paid_by, expense.split_type.value,
+            expense.payment_type.value, expense.date.isoformat(), expense.category, expense.group_id,
+            expense.id, expense.version,
+        ))
+        if cursor.rowcount == 0:
+            if self._connection.execute(EXPENSE_EXISTS, (expense.id,)).fetchone() is None:
+                raise KeyError(expense.id)
+            raise ConcurrentModificationError(expense.id)
+        self._connection.execute(DELETE_PARTICIPANTS, (expense.id,))
+        self._connection.execute(DELETE_EXTERNAL_PAYMENTS, (expense.id,))
+        self._write([expense], insert_expenses=False)
+        return self._connection.execute(INSERT_CHANGE, (expense.id,)).lastrowid
+
+    def delete(self, expense_id):
+        with self._lock, self._logging():
+            with self._connection:
+                cursor = self._connection.execute(DELETE_EXPENSE, (expense_id,))
+                if cursor.rowcount == 0:
+                    return False
+                sequence = self._connection.execute(INSERT_CHANGE, (expense_id,)).lastrowid
+            if self.event_log is not None:
+                self._log_events([Event.for_delete(sequence, expense_id)])
+            return True
+
+    def last_change(self):
+        with self._lock:
+            return self._connection.execute(SELECT_LAST_CHANGE).fetchone()[0]
+
+    def changes_since(self, sequence):
+        with self._lock:
+            return self._connection.execute(SELECT_CHANGES, (sequence,)).fetchall()
+
+
+def create_repository(database: str) -> ExpenseRepository:
+    """Repository for a database setting.
+
+    "memory" keeps everything in-process, "memory:compact" does the same with the
+    compact representation, and anything else is a SQLite path, whose event log
+    and snapshots are kept in a directory next to it (where the platform supports one).
+    """
+    if database == "memory":
+        return InMemoryExpenseRepository()
+    if database == "memory:compact":
+        return InMemoryExpenseRepository(compact=True)
+    return SQLiteExpenseRepository(database, EventLog(database + LOG_DIRECTORY_SUFFIX) if LOG_SUPPORTED else None)
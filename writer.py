@@ -0,0 +1,108 @@
+"""Background writer that group-commits expenses queued by concurrent requests.
+
+Requests hand their expenses to the writer and wait. The writer thread takes everything
+queued since its last commit and adds it in one durable repository transaction (and one
+event log append), so under load many requests share each commit, and its fsyncs, instead
+of paying for one each. A request's wait ends once the transaction holding its expenses has
+committed and reached the disk. If a shared commit fails, each of its requests is retried
+in a commit of its own, so one bad request does not fail the others.
+
+A request that gives up waiting (WRITE_TIMEOUT) does not take its expenses back: they may
+still be committed afterwards, so a caller retrying after a timeout can add them twice.
+"""
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+from models import Expense
+
+# Expenses committed per transaction at most; more than this waits for the next one
+MAX_COMMIT_SIZE = 5000
+# Seconds a request waits for its commit before giving up
+WRITE_TIMEOUT = 60
+
+
+class BatchWriter:
+    """Queue of expenses to add, drained by a single writer thread in shared transactions"""
+
+    def __init__(self, repository, max_commit_size: int = MAX_COMMIT_SIZE,
+                 on_commit: Optional[Callable[[List[Expense]], None]] = None):
+        self._repository = repository
+        self.max_commit_size = max_commit_size
+        # Called on the writer thread with each committed batch, before its requests are answered
+        self._on_commit = on_commit
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.commits = 0
+        self.committed = 0
+
+    def _ensure_started(self):
+        # Started on first use rather than at import, so a server that forks its workers
+        # after loading the app gives each worker a live writer thread of its own
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='expense-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, expenses: List[Expense]) -> Future:
+        """Queue expenses to be added; the future resolves once they are committed"""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((expenses, future))
+        return future
+
+    def write(self, expenses: List[Expense], timeout: float = WRITE_TIMEOUT):
+        """Add expenses through the shared commit and wait until they are durable.
+
+        Raises concurrent.futures.TimeoutError if that takes longer than timeout; the expenses
+        stay queued and may still be committed.
+        """
+        self.submit(expenses).result(timeout)
+
+    def _take(self) -> list:
+        """Block for the next request, then gather whatever else is queued up to the commit size"""
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        while size < self.max_commit_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _commit(self, pending: list):
+        """Add the expenses of the given requests in one transaction and answer the requests"""
+        expenses = [expense for batch, _ in pending for expense in batch]
+        self._repository.add_many(expenses, durable=True)
+        self.commits += 1
+        self.committed += len(expenses)
+        if self._on_commit is not None:
+            try:
+                self._on_commit(expenses)
+            except Exception:
+                # The expenses are committed regardless, so the requests still succeed
+                traceback.print_exc()
+        for _, future in pending:
+            future.set_result(None)
+
+    def _run(self):
+        while True:
+            pending = self._take()
+            try:
+                self._commit(pending)
+            except Exception as e:
+                if len(pending) == 1:
+                    pending[0][1].set_exception(e)
+                    continue
+                # The failed transaction was rolled back whole; commit each request on its
+                # own so only the ones that cannot be added fail
+                for request in pending:
+                    try:
+                        self._commit([request])
+                    except Exception as e:
+                        request[1].set_exception(e)